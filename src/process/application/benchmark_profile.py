@@ -0,0 +1,90 @@
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import rasterio
+from rasterio.crs import CRS
+from rasterio.transform import from_origin
+
+from process.writer import GeoTiffWriter, creation_profiles
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare output creation profiles on synthetic scenes.")
+    parser.add_argument("-p", "--profiles", choices=list(creation_profiles), type=str, nargs="+",
+                        default=list(creation_profiles), help="Creation profiles to benchmark.")
+    parser.add_argument("-o", "--output_folder", type=str,
+                        help="Folder for benchmark samples, a temp folder is used by default.")
+    parser.add_argument("--sample_count", type=int, default=200)
+    parser.add_argument("--window_size", type=int, default=256)
+    parser.add_argument("--band_count", type=int, default=4)
+    parser.add_argument("--dtype", type=str, default="uint16")
+    parser.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args()
+    return args
+
+
+def make_synthetic_scene(sample_count: int, band_count: int, window_size: int, dtype: str, seed: int):
+    """Smooth fields with noise in the range of reflectance, nearly as compressible as real sentinel-2 bands."""
+    rng = np.random.default_rng(seed)
+    low_size = window_size // 16
+    low = rng.uniform(500, 4000, size=(sample_count, band_count, low_size, low_size))
+    data = np.repeat(np.repeat(low, 16, axis=2), 16, axis=3)
+    data += rng.normal(0, 50, size=data.shape)
+    if np.dtype(dtype).kind in "ui":
+        data = np.clip(data, np.iinfo(dtype).min, np.iinfo(dtype).max)
+    return data.astype(dtype)
+
+
+def get_sample_profile(band_count: int, window_size: int, dtype: str):
+    # a source profile such as a band of sentinel-2 up sampled to 10m
+    return {"driver": "GTiff", "dtype": dtype, "count": band_count, "height": window_size, "width": window_size,
+            "crs": CRS.from_epsg(32650), "transform": from_origin(500000, 4000000, 10, 10), "nodata": None,
+            "compress": "deflate", "tiled": True, "blockxsize": 1024, "blockysize": 1024}
+
+
+def benchmark(profile_name: str, datas: np.ndarray, output_folder: str):
+    writer = GeoTiffWriter(profile_name)
+    profile = get_sample_profile(datas.shape[1], datas.shape[2], str(datas.dtype))
+    profile_folder = os.path.join(output_folder, profile_name)
+    output_paths = [os.path.join(profile_folder, f"{i}.tif") for i in range(len(datas))]
+
+    start = time.perf_counter()
+    for data, output_path in zip(datas, output_paths):
+        writer.write(output_path, data, profile)
+    write_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for output_path in output_paths:
+        with rasterio.open(output_path) as src:
+            src.read()
+    read_time = time.perf_counter() - start
+
+    file_size = sum(os.path.getsize(output_path) for output_path in output_paths)
+    shutil.rmtree(profile_folder)
+    return datas.nbytes / 1024 ** 2 / write_time, datas.nbytes / 1024 ** 2 / read_time, file_size / len(datas)
+
+
+def main():
+    args = parse_args()
+    datas = make_synthetic_scene(args.sample_count, args.band_count, args.window_size, args.dtype, args.seed)
+
+    output_folder = args.output_folder if args.output_folder is not None else tempfile.mkdtemp()
+    print(f"{args.sample_count} samples of {args.band_count} x {args.window_size} x {args.window_size} {args.dtype}, "
+          f"{datas[0].nbytes / 1024:.0f} KB raw per sample")
+    print(f"{'profile':<16}{'write MB/s':>12}{'read MB/s':>12}{'KB/sample':>12}{'ratio':>8}")
+    for profile_name in args.profiles:
+        write_speed, read_speed, sample_size = benchmark(profile_name, datas, output_folder)
+        print(f"{profile_name:<16}{write_speed:>12.1f}{read_speed:>12.1f}{sample_size / 1024:>12.1f}"
+              f"{datas[0].nbytes / sample_size:>8.2f}")
+
+    if args.output_folder is None:
+        shutil.rmtree(output_folder)
+
+
+if __name__ == "__main__":
+    main()
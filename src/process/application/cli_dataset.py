@@ -3,10 +3,13 @@ import os
 
 import rasterio
 import random
-from process.application.util import init_oo_cropper, init_shp_reader, img_folder_name
+from process.application.util import (init_oo_cropper, init_shp_reader, init_sat_reader, init_writer,
+                                      get_window_file_path, img_folder_name)
 from process.cropper import SlideWindowCropper, FileCropper
 from process.downloader import AwsSentinel2L2aDownloader, sentinel2_l2a_bands
-from process.sat_reader import StackReader, UnstackReader
+from process.sat_reader import RemoteStackReader
+from process.virtual_dataset import VirtualIndex
+from process.writer import writer_choices, creation_profiles
 
 def parse_args():
     cropper_choices = ["object", "slide", "file"]
@@ -22,12 +25,42 @@ def parse_args():
     parser.add_argument("-a", "--align_band", choices=sentinel2_l2a_bands, type=str, required=True)
     parser.add_argument("-s", "--use_stack", action=argparse.BooleanOptionalAction,
                         help="If stack or not.")
+    parser.add_argument("-l", "--lazy_read", action=argparse.BooleanOptionalAction,
+                        help="Read windows from band files on demand instead of loading whole scene, used with -s.")
+    parser.add_argument("--band_cache_folder", type=str,
+                        help="Folder to cache decoded bands as memory-mapped arrays, reruns skip decoding.")
+    parser.add_argument("--band_cache_size", type=float, default=50,
+                        help="Max size of band cache in GB, least recently used bands are evicted.")
     parser.add_argument("-c", "--cropper", choices=cropper_choices, type=str, required=True,
                         help="There are three cropper to choose.")
     parser.add_argument("--window_size", type=int,
                         help="This will be used if you choose object cropper and slide cropper.")
     parser.add_argument("--window_overlap_size", type=int,
                         help="This will be used if you choose slide cropper.")
+    parser.add_argument("--crop_workers", type=int, default=0,
+                        help="Number of processes planning windows of spatial blocks for object cropper, "
+                             "0 crops geometries in sequence.")
+    parser.add_argument("--download_workers", type=int, default=8,
+                        help="Number of bands downloaded at the same time.")
+    parser.add_argument("--stac_cache_folder", type=str,
+                        help="Folder to cache resolved STAC items, reruns will not search them again.")
+    parser.add_argument("--stac_catalog", type=str,
+                        help="Path of a static STAC catalog json, items are read from it instead of searching.")
+    parser.add_argument("--remote_read", action=argparse.BooleanOptionalAction,
+                        help="Only download align band, other bands are read window by window from remote "
+                             "Cloud-Optimized GeoTIFF, requires -s.")
+    parser.add_argument("--writer", choices=writer_choices, type=str, default="tif",
+                        help="Write every sample as a GeoTIFF file, or pack samples into tar shards with an index.")
+    parser.add_argument("--shard_size", type=float, default=1,
+                        help="Max size of one tar shard in GB, used with --writer tar.")
+    parser.add_argument("--creation_profile", choices=list(creation_profiles), type=str, default="source",
+                        help="Codec, predictor, level, tiling and overviews of GeoTIFF samples, "
+                             "source keeps the profile of input bands. Use benchmark_profile to compare them.")
+    parser.add_argument("--write_workers", type=int, default=0,
+                        help="Number of threads encoding and writing samples in background, 0 writes synchronously.")
+    parser.add_argument("--virtual", action=argparse.BooleanOptionalAction,
+                        help="Only write windows to index.json of output folder instead of cropping samples, "
+                             "VirtualDatasetReader reads samples from source bands and labels by it.")
 
     args = parser.parse_args()
 
@@ -41,72 +74,114 @@ def parse_args():
     if sum(args.train_val_test_percent) != 100:
         parser.error("Argument -p percentage should sum to 100.")
 
+    if args.remote_read and not args.use_stack:
+        parser.error("Argument --remote_read requires -s.")
+
+    if args.virtual and args.remote_read:
+        parser.error("Argument --virtual reads local bands, it can not be used with --remote_read.")
+
     return args
 
 
 def main():
     args = parse_args()
 
-    # 1. download aws sentinel-2 sat images
-    download_bands = list(set(args.bands+[args.align_band]))
+    # 1. download aws sentinel-2 sat images, remote read only needs align band for reference
+    if args.remote_read:
+        download_bands = [args.align_band]
+    else:
+        download_bands = list(set(args.bands+[args.align_band]))
     band_filenames = [f"{band}.tif" for band in args.bands]
-    aws_downloader = AwsSentinel2L2aDownloader()
-    aws_downloader.download_all_files(input_folder=args.input_folder,
-                                      download_sub_folder=img_folder_name,
-                                      bands=download_bands)
+    aws_downloader = AwsSentinel2L2aDownloader(max_workers=args.download_workers,
+                                                item_cache_folder=args.stac_cache_folder,
+                                                static_catalog_path=args.stac_catalog)
+    best_items = aws_downloader.download_all_files(input_folder=args.input_folder,
+                                                   download_sub_folder=img_folder_name,
+                                                   bands=download_bands)
+    if args.remote_read:
+        scene_hrefs = aws_downloader.get_all_item_hrefs(input_folder=args.input_folder, bands=args.bands,
+                                                        best_items=best_items)
 
     band_composition = "".join(args.bands)
-
-    # 2. iter scene folder
-    for scene_id in os.listdir(args.input_folder):
-        scene_folder = os.path.join(args.input_folder, scene_id)
-        if not os.path.isdir(scene_folder):
-            continue
-
-        sat_tif_path = os.path.join(scene_folder, img_folder_name, f"{args.align_band}.tif")
-        with rasterio.open(sat_tif_path) as src:
-            image_height = src.height
-            image_width = src.width
-
-        # 3. init shp reader
-        shp_reader = init_shp_reader(scene_folder, sat_tif_path)
-
-        # 4. init cropper
-        match args.cropper:
-            case "object":
-                cropper = init_oo_cropper(scene_folder, sat_tif_path, args.window_size, shp_reader)
-            case "slide":
-                cropper = SlideWindowCropper(image_height, image_width, args.window_size, args.window_overlap_size,
-                                             shp_reader)
-            case "file":
-                shp_file_path = os.path.join(scene_folder, "window", "window.shp")
-                cropper = FileCropper(shp_file_path, shp_reader)
-            case _:
-                raise ValueError
-
-        # 5. init sat reader
-        sat_folder = os.path.join(scene_folder, img_folder_name)
-        if args.use_stack:
-            sat_reader = StackReader(sat_folder, band_filenames, dst_resolution=10)
-        else:
-            sat_reader = UnstackReader(sat_folder, band_filenames)
-
-        # 6. start generate dataset
-        os.makedirs(args.output_folder, exist_ok=True)
-        sub_folder_names = ["train", "val", "test"]
-
-        for window, window_id in iter(cropper):
-
-            sub_folder_name = random.choices(sub_folder_names, weights=args.train_val_test_percent)[0]
-
-            filename = f"{scene_id}_{window}_{band_composition}.tif"
-
-            shp_output_path = os.path.join(args.output_folder, sub_folder_name, "gt", scene_id, filename)
-            sat_output_path = os.path.join(args.output_folder, sub_folder_name, "image", scene_id, filename)
-
-            shp_reader.crop_data(window, shp_output_path, window_id)
-            sat_reader.crop_data(window, str(sat_output_path))
-
+    # samples of all scenes are written by one writer, virtual dataset writes no sample and keeps old shards
+    writer = None
+    virtual_index = None
+    if args.virtual:
+        virtual_index = VirtualIndex(os.path.join(args.output_folder, "index.json"))
+    else:
+        writer = init_writer(args.writer, args.output_folder, shard_size=args.shard_size,
+                             write_workers=args.write_workers, creation_profile=args.creation_profile)
+
+    try:
+        # 2. iter scene folder
+        for scene_id in os.listdir(args.input_folder):
+            scene_folder = os.path.join(args.input_folder, scene_id)
+            if not os.path.isdir(scene_folder):
+                continue
+
+            sat_tif_path = os.path.join(scene_folder, img_folder_name, f"{args.align_band}.tif")
+            with rasterio.open(sat_tif_path) as src:
+                image_height = src.height
+                image_width = src.width
+
+            # 3. init shp reader
+            shp_reader = init_shp_reader(scene_folder, sat_tif_path, writer)
+
+            # 4. init cropper
+            match args.cropper:
+                case "object":
+                    cropper = init_oo_cropper(args.window_size, shp_reader, args.crop_workers)
+                case "slide":
+                    cropper = SlideWindowCropper(image_height, image_width, args.window_size, args.window_overlap_size,
+                                                 shp_reader)
+                case "file":
+                    cropper = FileCropper(get_window_file_path(scene_folder), shp_reader)
+                case _:
+                    raise ValueError
+
+            # 5. init sat reader, virtual dataset only records label and band paths
+            sat_folder = os.path.join(scene_folder, img_folder_name)
+            if args.virtual:
+                label_path = os.path.join(scene_folder, "rasterize", "label.tif")
+                shp_reader.save_label(label_path)
+                virtual_index.add_scene(scene_id, sat_folder, band_filenames, label_path)
+            elif args.remote_read:
+                cog_cache_folder = os.path.join(scene_folder, "cog_cache")
+                sat_reader = RemoteStackReader(scene_hrefs[scene_id], dst_resolution=10, cache_folder=cog_cache_folder,
+                                               writer=writer)
+            else:
+                sat_reader = init_sat_reader(sat_folder, band_filenames, args.use_stack, args.lazy_read,
+                                             args.band_cache_folder, args.band_cache_size, writer)
+
+            # 6. start generate dataset
+            os.makedirs(args.output_folder, exist_ok=True)
+            sub_folder_names = ["train", "val", "test"]
+
+            for window, window_id in iter(cropper):
+
+                sub_folder_name = random.choices(sub_folder_names, weights=args.train_val_test_percent)[0]
+
+                if args.virtual:
+                    virtual_index.add_sample(scene_id, window, sub_folder_name, window_id)
+                    shp_reader.update_cropped_area(window)
+                    continue
+
+                filename = f"{scene_id}_{window}_{band_composition}.tif"
+
+                shp_output_path = os.path.join(args.output_folder, sub_folder_name, "gt", scene_id, filename)
+                sat_output_path = os.path.join(args.output_folder, sub_folder_name, "image", scene_id, filename)
+
+                shp_reader.crop_data(window, shp_output_path, window_id)
+                sat_reader.crop_data(window, str(sat_output_path))
+
+            if not args.virtual:
+                sat_reader.close()
+    finally:
+        # shards are renamed from .part files only when writer is closed
+        if writer is not None:
+            writer.close()
+    if args.virtual:
+        virtual_index.save()
 
 
 if __name__ == "__main__":
@@ -8,11 +8,12 @@ import rasterio
 from tqdm.contrib.concurrent import process_map
 import random
 from process.application.util import get_last_level_sub_folders
-from process.application.util import init_oo_cropper, init_shp_reader
+from process.application.util import init_oo_cropper, init_shp_reader, init_sat_reader, init_writer
 from process.cropper import SlideWindowCropper, FileCropper
 from process.downloader import AwsSentinel2L2aDownloader, sentinel2_l2a_bands
-from process.sat_reader import StackReader, UnstackReader, LuccReader
+from process.sat_reader import LuccReader, ClassRemapper
 from process.util import window2geom
+from process.writer import writer_choices, creation_profiles
 import dataclasses
 
 
@@ -21,6 +22,11 @@ def parse_args():
     parser.add_argument("-i1", "--sat_folder", type=str, required=True, help="Input sat folder.")
     parser.add_argument("-i2", "--lucc_folder", type=str, required=True, help="Input lucc folder.")
     parser.add_argument("-o", "--output_folder", type=str, required=True)
+    parser.add_argument("--lucc_filename", type=str, default=LuccReader.lucc_filename,
+                        help="Land cover file in each lucc scene folder.")
+    parser.add_argument("--class_map", type=str,
+                        help='Json of class mapping table, such as {"mapping": {"10": 1}, "default_value": 0}. '
+                             'Default is the mapping of lulc.tif.')
     parser.add_argument("-p", "--train_val_test_percent", type=int, required=True, nargs="+",
                         help="The percentage value attributed to train/val/test dataset, "
                              "sum to 100.")
@@ -29,12 +35,29 @@ def parse_args():
                              "if the -s flag is chosen.")
     parser.add_argument("-s", "--use_stack", action=argparse.BooleanOptionalAction,
                         help="If stack or not.")
+    parser.add_argument("-l", "--lazy_read", action=argparse.BooleanOptionalAction,
+                        help="Read windows from band files on demand instead of loading whole scene, used with -s.")
+    parser.add_argument("--band_cache_folder", type=str,
+                        help="Folder to cache decoded bands as memory-mapped arrays, reruns skip decoding.")
+    parser.add_argument("--band_cache_size", type=float, default=50,
+                        help="Max size of band cache in GB, least recently used bands are evicted.")
     parser.add_argument("-d", "--delete_input", action=argparse.BooleanOptionalAction,
                         help="If delete input sat image.")
     parser.add_argument("--window_size", type=int, required=True,
                         help="This will be used if you choose object cropper and slide cropper.")
     parser.add_argument("--window_overlap_size", type=int, required=True,
                         help="This will be used if you choose slide cropper.")
+    parser.add_argument("--drop_nodata_percentage", type=float,
+                        help="Drop windows whose nodata percentage is not less than this, checked by nodata index.")
+    parser.add_argument("--writer", choices=writer_choices, type=str, default="tif",
+                        help="Write every sample as a GeoTIFF file, or pack samples into tar shards with an index.")
+    parser.add_argument("--shard_size", type=float, default=1,
+                        help="Max size of one tar shard in GB, used with --writer tar.")
+    parser.add_argument("--creation_profile", choices=list(creation_profiles), type=str, default="source",
+                        help="Codec, predictor, level, tiling and overviews of GeoTIFF samples, "
+                             "source keeps the profile of input bands. Use benchmark_profile to compare them.")
+    parser.add_argument("--write_workers", type=int, default=0,
+                        help="Number of threads encoding and writing samples in background, 0 writes synchronously.")
 
     args = parser.parse_args()
 
@@ -52,11 +75,22 @@ class RunArg:
     window_overlap_size: int
     bands: list[str]
     use_stack: bool
+    lazy_read: bool
+    band_cache_folder: str
+    band_cache_size: float
+    drop_nodata_percentage: float
+    writer: str
+    shard_size: float
+    creation_profile: str
+    write_workers: int
     train_val_test_percent: list[int]
     delete_input: bool
+    lucc_filename: str
+    class_map: str
 
 
 def run(args: RunArg):
+    writer = None
     try:
         scene_id = os.path.basename(args.scene_folder)
 
@@ -65,14 +99,22 @@ def run(args: RunArg):
             image_height = src.height
             image_width = src.width
 
-        cropper = SlideWindowCropper(image_height, image_width, args.window_size, args.window_overlap_size, shp_reader=None)
-
         band_filenames = [f"{band}.tif" for band in args.bands]
-        if args.use_stack:
-            sat_reader = StackReader(args.scene_folder, band_filenames, dst_resolution=10)
-        else:
-            sat_reader = UnstackReader(args.scene_folder, band_filenames)
-        lucc_reader = LuccReader(args.lucc_folder, dst_resolution=10)
+        # scenes run in parallel, each scene writes its own shards
+        writer = init_writer(args.writer, args.output_folder, prefix=os.path.basename(args.scene_folder),
+                             shard_size=args.shard_size, write_workers=args.write_workers,
+                             creation_profile=args.creation_profile)
+        sat_reader = init_sat_reader(args.scene_folder, band_filenames, args.use_stack, args.lazy_read,
+                                     args.band_cache_folder, args.band_cache_size, writer)
+
+        # windows with too much nodata are dropped by the cropper before reading
+        nodata_index = sat_reader.get_nodata_index() if args.drop_nodata_percentage is not None else None
+        cropper = SlideWindowCropper(image_height, image_width, args.window_size, args.window_overlap_size,
+                                     shp_reader=None, nodata_index=nodata_index,
+                                     drop_nodata_percentage=args.drop_nodata_percentage)
+        class_remapper = ClassRemapper.from_json(args.class_map) if args.class_map is not None else None
+        lucc_reader = LuccReader(args.lucc_folder, dst_resolution=10, lucc_filename=args.lucc_filename,
+                                 class_remapper=class_remapper, writer=writer)
 
         os.makedirs(args.output_folder, exist_ok=True)
         sub_folder_names = ["train", "val", "test"]
@@ -84,8 +126,12 @@ def run(args: RunArg):
             sub_folder_name = random.choices(sub_folder_names, weights=args.train_val_test_percent)[0]
             sat_output_path = os.path.join(args.output_folder, sub_folder_name, "sat", scene_id, f"{window_id}.tif")
             gt_output_path = os.path.join(args.output_folder, sub_folder_name, "gt", scene_id, f"{window_id}.tif")
-            sat_reader.crop_data(window, sat_output_path)
-            lucc_reader.crop_data(window, gt_output_path)
+            # gt is only written with its image
+            if sat_reader.crop_data(window, sat_output_path, drop_nodata_percentage=args.drop_nodata_percentage):
+                lucc_reader.crop_data(window, gt_output_path)
+        sat_reader.close()
+        writer.close()
+        writer = None
 
         metadata_filenames = ["granule_metadata.xml", "tileinfo_metadata.json"]
         #todo: bad string
@@ -93,12 +139,17 @@ def run(args: RunArg):
             for filename in metadata_filenames:
                 src_path = os.path.join(args.scene_folder, filename)
                 dst_path = os.path.join(args.output_folder, sub_folder_name, "sat", scene_id, filename)
+                # sample folders are not created by tar writer
+                os.makedirs(os.path.dirname(dst_path), exist_ok=True)
                 shutil.copy(src_path, dst_path)
     except Exception as e:
         with open("log.txt", "w+") as f:
             f.write(str(e))
 
     finally:
+        # writer of a failed scene is closed too, shards are renamed from .part files only when it is closed
+        if writer is not None:
+            writer.close()
         if args.delete_input:
             shutil.rmtree(args.scene_folder)
             shutil.rmtree(args.lucc_folder)
@@ -116,7 +167,12 @@ def main():
         lucc_folder = scene_folder.replace(args.sat_folder, args.lucc_folder)
         run_arg = RunArg(scene_folder=scene_folder, lucc_folder=lucc_folder, output_folder=args.output_folder,
                          window_size=args.window_size, window_overlap_size=args.window_overlap_size,
-                         bands=args.bands, use_stack=args.use_stack, delete_input=args.delete_input,
+                         bands=args.bands, use_stack=args.use_stack, lazy_read=args.lazy_read,
+                         band_cache_folder=args.band_cache_folder, band_cache_size=args.band_cache_size,
+                         drop_nodata_percentage=args.drop_nodata_percentage,
+                         writer=args.writer, shard_size=args.shard_size, write_workers=args.write_workers,
+                         creation_profile=args.creation_profile,
+                         delete_input=args.delete_input, lucc_filename=args.lucc_filename, class_map=args.class_map,
                          train_val_test_percent=args.train_val_test_percent)
         run(run_arg)
         run_args.append(run_arg)
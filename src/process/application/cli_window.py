@@ -21,6 +21,12 @@ def parse_args():
     parser.add_argument("--window_size", type=int)
     parser.add_argument("--window_overlap_size", type=int, default=0,
                         help="This will be used if you choose slide cropper.")
+    parser.add_argument("--download_workers", type=int, default=8,
+                        help="Number of bands downloaded at the same time.")
+    parser.add_argument("--stac_cache_folder", type=str,
+                        help="Folder to cache resolved STAC items, reruns will not search them again.")
+    parser.add_argument("--stac_catalog", type=str,
+                        help="Path of a static STAC catalog json, items are read from it instead of searching.")
 
     args = parser.parse_args()
 
@@ -35,7 +41,9 @@ def main():
     args = parse_args()
 
     # 1. download aws sentinel-2 sat images, will skip exist band
-    aws_downloader = AwsSentinel2L2aDownloader()
+    aws_downloader = AwsSentinel2L2aDownloader(max_workers=args.download_workers,
+                                                item_cache_folder=args.stac_cache_folder,
+                                                static_catalog_path=args.stac_catalog)
     aws_downloader.download_all_files(input_folder=args.input_folder,
                                       download_sub_folder=img_folder_name,
                                       bands=[args.align_band])
@@ -72,7 +80,8 @@ def main():
         # 4. init cropper
         match args.cropper:
             case "object":
-                cropper = init_oo_cropper(scene_folder, sat_tif_path, args.window_size, shp_reader)
+                # windows are not cropped from score data here, which the partitioned cropper plans with
+                cropper = init_oo_cropper(args.window_size, shp_reader)
             case "slide":
                 cropper = SlideWindowCropper(image_height, image_width, args.window_size, args.window_overlap_size,
                                              shp_reader)
@@ -0,0 +1,65 @@
+import argparse
+import glob
+import os
+
+import geopandas
+import pandas as pd
+
+merge_formats = ["fgb", "parquet"]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Merge label shapefiles of a folder into one indexed file.")
+    parser.add_argument("-i", "--input_folder", type=str, required=True, help="Folder of label shapefiles.")
+    parser.add_argument("-o", "--output_path", type=str, required=True,
+                        help="Output .fgb (FlatGeobuf) or .parquet (GeoParquet) file.")
+    parser.add_argument("--row_group_size", type=int, default=50000,
+                        help="Features per row group of GeoParquet, a row group is skipped as a whole by bbox.")
+
+    args = parser.parse_args()
+    return args
+
+
+def read_label_folder(input_folder: str):
+    gdfs = []
+    for shp_path in sorted(glob.glob(os.path.join(input_folder, "*.shp"))):
+        gdf = geopandas.read_file(shp_path, columns=[])
+        if len(gdfs) > 0 and gdf.crs != gdfs[0].crs:
+            gdf = gdf.to_crs(gdfs[0].crs)
+        gdfs.append(gdf)
+    if len(gdfs) == 0:
+        raise FileNotFoundError(f"no shapefile in {input_folder}")
+
+    gdf = geopandas.GeoDataFrame(pd.concat(gdfs, ignore_index=True), crs=gdfs[0].crs)
+    return gdf[gdf.geometry.notna() & ~gdf.geometry.is_empty]
+
+
+def merge_labels(input_folder: str, output_path: str, row_group_size: int = 50000):
+    """Merge shapefiles into one file sorted along a hilbert curve, so nearby features are stored together.
+
+    FlatGeobuf is written with its packed R-tree, GeoParquet with a bbox covering column.
+    """
+    gdf = read_label_folder(input_folder)
+    gdf = gdf.iloc[gdf.hilbert_distance().argsort()].reset_index(drop=True)
+
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    temp_path = f"{os.path.splitext(output_path)[0]}.tmp{os.path.splitext(output_path)[1]}"
+    match os.path.splitext(output_path)[1].lower():
+        case ".fgb":
+            gdf.to_file(temp_path, driver="FlatGeobuf", SPATIAL_INDEX="YES")
+        case ".parquet":
+            gdf.to_parquet(temp_path, write_covering_bbox=True, row_group_size=row_group_size)
+        case _:
+            raise ValueError(f"output format should be one of {merge_formats}")
+    os.replace(temp_path, output_path)
+    return len(gdf)
+
+
+def main():
+    args = parse_args()
+    feature_count = merge_labels(args.input_folder, args.output_path, args.row_group_size)
+    print(f"merged {feature_count} features into {args.output_path}")
+
+
+if __name__ == "__main__":
+    main()
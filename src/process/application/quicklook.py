@@ -0,0 +1,137 @@
+import argparse
+import dataclasses
+import glob
+import os
+
+import numpy as np
+import rasterio
+from tqdm.contrib.concurrent import process_map
+
+from process.application.util import init_sat_reader, init_shp_reader
+from process.cropper import SlideWindowCropper
+from process.downloader import sentinel2_l2a_bands
+from process.sat_reader.util import read_decimated, percentile_stretch
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generate RGB quicklooks of scenes from decimated reads.")
+    parser.add_argument("-i", "--input_folder", type=str, required=True,
+                        help="Every folder with the red band under it is a scene.")
+    parser.add_argument("-o", "--output_folder", type=str, required=True)
+    parser.add_argument("-b", "--rgb_bands", choices=sentinel2_l2a_bands, type=str, nargs=3,
+                        default=["B04", "B03", "B02"], help="Bands of red, green and blue channel.")
+    parser.add_argument("--size", type=int, default=1024, help="Max height and width of quicklook.")
+    parser.add_argument("--percentile", type=float, nargs=2, default=[2, 98],
+                        help="Low and high percentile of stretch.")
+    parser.add_argument("--window_size", type=int,
+                        help="Overlay windows of slide cropper with this window size.")
+    parser.add_argument("--window_overlap_size", type=int, default=0,
+                        help="Overlap size of slide cropper windows to overlay.")
+    parser.add_argument("--bands", choices=sentinel2_l2a_bands, type=str, nargs="+",
+                        help="Bands of the cropping run, whose nodata index drops windows. Default is rgb bands.")
+    parser.add_argument("-s", "--use_stack", action=argparse.BooleanOptionalAction,
+                        help="If the cropping run stacks bands, which decides its nodata index.")
+    parser.add_argument("--drop_nodata_percentage", type=float,
+                        help="Only overlay windows whose nodata percentage is less than this, as the cropping run.")
+    parser.add_argument("--label", action=argparse.BooleanOptionalAction,
+                        help="Only overlay windows with label and without unsure pixels, as cli_dataset. Labels are "
+                             "read from the gt folder beside the image folder of scene.")
+    parser.add_argument("--max_workers", type=int, default=os.cpu_count())
+
+    args = parser.parse_args()
+    if args.bands is None:
+        args.bands = args.rgb_bands
+    return args
+
+
+@dataclasses.dataclass
+class RunArg:
+    scene_folder: str
+    output_path: str
+    rgb_bands: list[str]
+    size: int
+    percentile: list[float]
+    window_size: int
+    window_overlap_size: int
+    bands: list[str]
+    use_stack: bool
+    drop_nodata_percentage: float
+    label: bool
+
+
+def init_cropper(args: RunArg, red_path: str, image_height: int, image_width: int):
+    """Slide cropper built like the cropping run, so the overlay shows the windows it writes."""
+    nodata_index = None
+    if args.drop_nodata_percentage is not None:
+        band_filenames = [f"{band}.tif" for band in args.bands]
+        sat_reader = init_sat_reader(args.scene_folder, band_filenames, args.use_stack, lazy_read=True)
+        nodata_index = sat_reader.get_nodata_index()
+        sat_reader.close()
+    shp_reader = init_shp_reader(os.path.dirname(args.scene_folder), red_path) if args.label else None
+    return SlideWindowCropper(image_height, image_width, args.window_size, args.window_overlap_size,
+                              shp_reader, nodata_index, args.drop_nodata_percentage)
+
+
+def draw_windows(data: np.ndarray, scale: float, cropper: SlideWindowCropper):
+    color = np.array([255, 255, 0], dtype=np.uint8)[:, None]
+    for window, _ in cropper:
+        # later windows are scored on the area not cropped yet, as the cropping run
+        if cropper.shp_reader is not None:
+            cropper.shp_reader.update_cropped_area(window)
+        row_start = min(int(window.row_start * scale), data.shape[1] - 1)
+        row_end = min(int(window.row_end * scale), data.shape[1] - 1)
+        col_start = min(int(window.col_start * scale), data.shape[2] - 1)
+        col_end = min(int(window.col_end * scale), data.shape[2] - 1)
+        data[:, row_start, col_start:col_end + 1] = color
+        data[:, row_end, col_start:col_end + 1] = color
+        data[:, row_start:row_end + 1, col_start] = color
+        data[:, row_start:row_end + 1, col_end] = color
+
+
+def run(args: RunArg):
+    # 1. quicklook shape follows red band, the grid of windows
+    red_path = os.path.join(args.scene_folder, f"{args.rgb_bands[0]}.tif")
+    with rasterio.open(red_path) as src:
+        image_height, image_width = src.height, src.width
+        scale = min(1, args.size / max(image_height, image_width))
+        height, width = max(1, round(image_height * scale)), max(1, round(image_width * scale))
+        transform = src.transform * src.transform.scale(image_width / width, image_height / height)
+        crs = src.crs
+
+    # 2. decimated read and stretch
+    data = np.concatenate([read_decimated(os.path.join(args.scene_folder, f"{band}.tif"), height, width)
+                           for band in args.rgb_bands])
+    data = percentile_stretch(data, *args.percentile)
+
+    if args.window_size is not None:
+        draw_windows(data, scale, init_cropper(args, red_path, image_height, image_width))
+
+    profile = {"driver": "JPEG", "dtype": "uint8", "count": 3, "height": height, "width": width,
+               "crs": crs, "transform": transform}
+    os.makedirs(os.path.dirname(args.output_path), exist_ok=True)
+    with rasterio.open(args.output_path, "w", **profile) as dst:
+        dst.write(data)
+
+
+def main():
+    args = parse_args()
+
+    run_args = []
+    red_filename = f"{args.rgb_bands[0]}.tif"
+    for red_path in sorted(glob.glob(os.path.join(args.input_folder, "**", red_filename), recursive=True)):
+        scene_folder = os.path.dirname(red_path)
+        scene_name = os.path.relpath(scene_folder, args.input_folder).replace(os.sep, "_")
+        if scene_name == ".":
+            scene_name = os.path.basename(os.path.abspath(scene_folder))
+        run_args.append(RunArg(scene_folder=scene_folder,
+                               output_path=os.path.join(args.output_folder, f"{scene_name}.jpg"),
+                               rgb_bands=args.rgb_bands, size=args.size, percentile=args.percentile,
+                               window_size=args.window_size, window_overlap_size=args.window_overlap_size,
+                               bands=args.bands, use_stack=args.use_stack,
+                               drop_nodata_percentage=args.drop_nodata_percentage, label=args.label))
+
+    process_map(run, run_args, max_workers=args.max_workers)
+
+
+if __name__ == "__main__":
+    main()
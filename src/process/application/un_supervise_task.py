@@ -4,8 +4,9 @@ import os
 import rasterio
 import dataclasses
 from process.cropper import SlideWindowCropper
-from process.sat_reader import StackReader, UnstackReader
-from process.application.util import get_last_level_sub_folders
+from process.virtual_dataset import VirtualIndex
+from process.writer import writer_choices, creation_profiles
+from process.application.util import get_last_level_sub_folders, init_sat_reader, init_writer
 import json
 import shutil
 from tqdm.contrib.concurrent import process_map
@@ -19,13 +20,35 @@ def parse_args():
                         help="These bands will be downloaded and subsequently stacked in the order of your input "
                              "if the -s flag is chosen.")
     parser.add_argument("-s", "--use_stack", action=argparse.BooleanOptionalAction, help="If stack or not.")
+    parser.add_argument("-l", "--lazy_read", action=argparse.BooleanOptionalAction,
+                        help="Read windows from band files on demand instead of loading whole scene, used with -s.")
+    parser.add_argument("--band_cache_folder", type=str,
+                        help="Folder to cache decoded bands as memory-mapped arrays, reruns skip decoding.")
+    parser.add_argument("--band_cache_size", type=float, default=50,
+                        help="Max size of band cache in GB, least recently used bands are evicted.")
     parser.add_argument("-d", "--delete_input", action=argparse.BooleanOptionalAction, help="If delete input sat image.")
     parser.add_argument("--window_size", type=int,
                         help="This will be used if you choose object cropper and slide cropper.")
     parser.add_argument("--window_overlap_size", type=int,
                         help="This will be used if you choose slide cropper.")
+    parser.add_argument("--drop_nodata_percentage", type=float,
+                        help="Drop windows whose nodata percentage is not less than this, checked by nodata index.")
+    parser.add_argument("--writer", choices=writer_choices, type=str, default="tif",
+                        help="Write every sample as a GeoTIFF file, or pack samples into tar shards with an index.")
+    parser.add_argument("--shard_size", type=float, default=1,
+                        help="Max size of one tar shard in GB, used with --writer tar.")
+    parser.add_argument("--creation_profile", choices=list(creation_profiles), type=str, default="source",
+                        help="Codec, predictor, level, tiling and overviews of GeoTIFF samples, "
+                             "source keeps the profile of input bands. Use benchmark_profile to compare them.")
+    parser.add_argument("--virtual", action=argparse.BooleanOptionalAction,
+                        help="Only write windows to index.json of each scene output folder instead of cropping "
+                             "samples, VirtualDatasetReader reads samples from source bands by it.")
 
     args = parser.parse_args()
+
+    if args.virtual and args.delete_input:
+        parser.error("Argument --virtual reads samples from input sat image, it can not be deleted.")
+
     return args
 
 
@@ -37,32 +60,61 @@ class RunArg:
     window_overlap_size: int
     bands: list[str]
     use_stack: bool
+    lazy_read: bool
+    band_cache_folder: str
+    band_cache_size: float
+    drop_nodata_percentage: float
+    writer: str
+    shard_size: float
+    creation_profile: str
+    virtual: bool
     delete_input: bool
 
 
 def run(args: RunArg):
+    writer = None
     try:
         sat_tif_path = os.path.join(args.scene_folder, "B02.tif")
         with rasterio.open(sat_tif_path) as src:
             image_height = src.height
             image_width = src.width
 
-        cropper = SlideWindowCropper(image_height, image_width, args.window_size, args.window_overlap_size, shp_reader=None)
-
         band_filenames = [f"{band}.tif" for band in args.bands]
-        if args.use_stack:
-            sat_reader = StackReader(args.scene_folder, band_filenames, dst_resolution=10)
+        if args.virtual:
+            # virtual dataset reads bands only to build nodata index, band by band, and writes no shard
+            sat_reader = init_sat_reader(args.scene_folder, band_filenames, use_stack=True, lazy_read=True)
         else:
-            sat_reader = UnstackReader(args.scene_folder, band_filenames)
+            # scenes run in parallel, each scene writes its own shards
+            writer = init_writer(args.writer, args.output_folder, prefix=os.path.basename(args.scene_folder),
+                                 shard_size=args.shard_size, creation_profile=args.creation_profile)
+            sat_reader = init_sat_reader(args.scene_folder, band_filenames, args.use_stack, args.lazy_read,
+                                         args.band_cache_folder, args.band_cache_size, writer)
+
+        # windows with too much nodata are dropped by the cropper before reading
+        nodata_index = sat_reader.get_nodata_index() if args.drop_nodata_percentage is not None else None
+        cropper = SlideWindowCropper(image_height, image_width, args.window_size, args.window_overlap_size,
+                                     shp_reader=None, nodata_index=nodata_index,
+                                     drop_nodata_percentage=args.drop_nodata_percentage)
 
         os.makedirs(args.output_folder, exist_ok=True)
         metadata_output_path = os.path.join(args.output_folder, "metadata.json")
         with open(metadata_output_path, "w") as file:
             json.dump(obj={"bands": args.bands}, fp=file)
 
-        for window, window_id in iter(cropper):
-            sat_output_path = os.path.join(args.output_folder, f"{window_id}.tif")
-            sat_reader.crop_data(window, sat_output_path)
+        if args.virtual:
+            virtual_index = VirtualIndex(os.path.join(args.output_folder, "index.json"))
+            virtual_index.add_scene(os.path.basename(args.scene_folder), args.scene_folder, band_filenames)
+            for window, window_id in iter(cropper):
+                virtual_index.add_sample(os.path.basename(args.scene_folder), window, None, window_id)
+            virtual_index.save()
+        else:
+            for window, window_id in iter(cropper):
+                sat_output_path = os.path.join(args.output_folder, f"{window_id}.tif")
+                sat_reader.crop_data(window, sat_output_path, drop_nodata_percentage=args.drop_nodata_percentage)
+        sat_reader.close()
+        if writer is not None:
+            writer.close()
+            writer = None
 
         metadata_filename = ["granule_metadata.xml", "tileinfo_metadata.json"]
         for filename in metadata_filename:
@@ -74,6 +126,9 @@ def run(args: RunArg):
         return 1
 
     finally:
+        # writer of a failed scene is closed too, shards are renamed from .part files only when it is closed
+        if writer is not None:
+            writer.close()
         if args.delete_input:
             shutil.rmtree(args.scene_folder)
 
@@ -89,7 +144,12 @@ def main():
         output_folder = os.path.join(args.output_folder, os.path.basename(scene_folder))
         run_arg = RunArg(scene_folder=scene_folder, output_folder=str(output_folder),
                          window_size=args.window_size, window_overlap_size=args.window_overlap_size,
-                         bands=args.bands, use_stack=args.use_stack, delete_input=args.delete_input)
+                         bands=args.bands, use_stack=args.use_stack, lazy_read=args.lazy_read,
+                         band_cache_folder=args.band_cache_folder, band_cache_size=args.band_cache_size,
+                         drop_nodata_percentage=args.drop_nodata_percentage,
+                         writer=args.writer, shard_size=args.shard_size, creation_profile=args.creation_profile,
+                         virtual=args.virtual,
+                         delete_input=args.delete_input)
         run_args.append(run_arg)
 
     process_map(run, run_args)
@@ -1,18 +1,32 @@
-import glob
 import os
 
-import rasterio
-from osgeo import ogr
-
-from process.cropper import ObjectOrientedCropper
+from process.cropper import ObjectOrientedCropper, PartitionedObjectCropper
 from process.gt_reader import ShpReader
-from process.util import window2geom, WindowArg
+from process.gt_reader.util import find_label_files
+from process.sat_reader import StackReader, UnstackReader, LazyStackReader, DecodedBandCache
+from process.writer import BaseWriter, GeoTiffWriter, TarShardWriter, AsyncWriter
 
 gt_folder_name = "gt"
 img_folder_name = "image"
 
 
-def init_shp_reader(scene_folder: str, sat_tif_path: str):
+def init_writer(writer_name: str, output_folder: str, prefix: str = "shard", shard_size: float = 1,
+                write_workers: int = 0, creation_profile: str = None):
+    match writer_name:
+        case "tif":
+            writer = GeoTiffWriter(creation_profile)
+        case "tar":
+            writer = TarShardWriter(output_folder, prefix, max_shard_size=int(shard_size * 1024 ** 3))
+        case _:
+            raise ValueError
+
+    # encode and write samples in background threads
+    if write_workers > 0:
+        writer = AsyncWriter(writer, max_workers=write_workers)
+    return writer
+
+
+def init_shp_reader(scene_folder: str, sat_tif_path: str, writer: BaseWriter = None):
 
     gt_folder = os.path.join(scene_folder, "gt")
 
@@ -23,8 +37,8 @@ def init_shp_reader(scene_folder: str, sat_tif_path: str):
         label_folder = os.path.join(gt_folder, label_value)
         if label_value.isdigit() and os.path.isdir(label_folder):
             value = int(label_value)
-            for shp_path in glob.glob(os.path.join(label_folder, "*.shp")):
-                label_paths.append(shp_path)
+            for label_path in find_label_files(label_folder):
+                label_paths.append(label_path)
                 burn_values.append(value)
 
     if len(label_paths) == 0:
@@ -36,39 +50,42 @@ def init_shp_reader(scene_folder: str, sat_tif_path: str):
 
     rasterize_output_folder = os.path.join(scene_folder, "rasterize")
 
-    shp_reader = ShpReader(sat_tif_path, rasterize_output_folder, label_paths, burn_values, false_path, unsure_path)
+    shp_reader = ShpReader(sat_tif_path, rasterize_output_folder, label_paths, burn_values, false_path, unsure_path,
+                           writer=writer)
     return shp_reader
 
 
-def get_shapefile_geometry_list(shapefile_path_list: list[str], sat_geometry: ogr.Geometry) -> list[ogr.Geometry]:
-    driver = ogr.GetDriverByName("ESRI Shapefile")
-    geometry_list = []
-    for shp in shapefile_path_list:
-        ds = driver.Open(shp, 0)
-        layer = ds.GetLayer()
-        for feature in layer:
-            geometry = feature.GetGeometryRef()
-            if geometry is not None and sat_geometry.Intersect(geometry):
-                geometry_list.append(geometry.Clone())
-    return geometry_list
-
-
-def init_oo_cropper(scene_folder: str, sat_tif_path: str, window_size: int, shp_reader: ShpReader):
-    with rasterio.open(sat_tif_path) as src:
-        image_height = src.height
-        image_width = src.width
-        sat_transformer = rasterio.transform.AffineTransformer(src.transform)
-        sat_geom = window2geom(sat_transformer, WindowArg(0, image_height, 0, image_width))
-
-    sample_shapefiles = []
-    for label_value in os.listdir(scene_folder):
-        label_folder = os.path.join(scene_folder, label_value)
-        if label_value.isdigit() and os.path.isdir(label_folder):
-            for shp_path in glob.glob(os.path.join(label_folder, "*.shp")):
-                sample_shapefiles.append(shp_path)
+def get_window_file_path(scene_folder: str):
+    # window file may be converted from shapefile to FlatGeobuf or GeoParquet
+    window_paths = find_label_files(os.path.join(scene_folder, "window"))
+    if len(window_paths) == 0:
+        return os.path.join(scene_folder, "window", "window.shp")
+    return window_paths[0]
+
+
+def init_sat_reader(sat_folder: str, band_filenames: list[str], use_stack: bool, lazy_read: bool = False,
+                    band_cache_folder: str = None, band_cache_size: float = None, writer: BaseWriter = None):
+    band_cache = None
+    if band_cache_folder is not None:
+        band_cache = DecodedBandCache(band_cache_folder, max_size=int(band_cache_size * 1024 ** 3))
+
+    if use_stack and lazy_read:
+        return LazyStackReader(sat_folder, band_filenames, dst_resolution=10, writer=writer)
+    elif use_stack:
+        return StackReader(sat_folder, band_filenames, dst_resolution=10, band_cache=band_cache, writer=writer)
+    else:
+        return UnstackReader(sat_folder, band_filenames, band_cache=band_cache, writer=writer)
+
+
+def init_oo_cropper(window_size: int, shp_reader: ShpReader, crop_workers: int = 0):
+    # large geometries first, the geometry list of shp reader is not reordered
+    geometry_list = sorted(shp_reader.get_geometry_list(), key=lambda x: x.Area(), reverse=True)
+    image_height, image_width = shp_reader.profile["height"], shp_reader.profile["width"]
+    # plan windows of spatial blocks in parallel processes
+    if crop_workers > 0:
+        return PartitionedObjectCropper(image_height, image_width, window_size, geometry_list, shp_reader,
+                                        max_workers=crop_workers)
 
-    geometry_list = get_shapefile_geometry_list(sample_shapefiles, sat_geom)
-    geometry_list.sort(key=lambda x: x.Area(), reverse=True)
     cropper = ObjectOrientedCropper(image_height, image_width, window_size, geometry_list, shp_reader)
 
     return cropper
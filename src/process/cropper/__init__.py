@@ -1,4 +1,5 @@
 from .object_orient_cropper import ObjectOrientedCropper
+from .partitioned_cropper import PartitionedObjectCropper
 from .slide_window_cropper import SlideWindowCropper
 from .file_cropper import FileCropper
 
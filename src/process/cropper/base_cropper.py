@@ -1,12 +1,16 @@
 from osgeo import ogr
 
 from process.gt_reader.shp_reader import ShpReader
+from process.integral_image import NodataIndex
 from process.util import WindowArg
 
 
 class BaseCropper:
-    def __init__(self, shp_reader: ShpReader):
+    def __init__(self, shp_reader: ShpReader, nodata_index: NodataIndex = None, drop_nodata_percentage: float = None):
         self.shp_reader = shp_reader
+        # windows are filtered by nodata index of sat reader before any band is sliced
+        self.nodata_index = nodata_index
+        self.drop_nodata_percentage = drop_nodata_percentage
 
     def __iter__(self):
         raise NotImplementedError
@@ -14,8 +18,11 @@ class BaseCropper:
     def get_geom_window(self, geometry: ogr.Geometry):
         # mbr in crs: (minX, maxX, minY, maxY)
         min_x, max_x, min_y, max_y = geometry.GetEnvelope()
-        row_start, col_start = self.shp_reader.affine_transform.rowcol(min_x, min_y)
-        row_end, col_end = self.shp_reader.affine_transform.rowcol(max_x, max_y)
+        return self.get_bounds_window(min_x, min_y, max_x, max_y)
+
+    def get_bounds_window(self, min_x: float, min_y: float, max_x: float, max_y: float):
+        (row_start, row_end), (col_start, col_end) = self.shp_reader.affine_transform.rowcol([min_x, max_x],
+                                                                                            [min_y, max_y])
 
         if row_start > row_end:
             row_start, row_end = row_end, row_start
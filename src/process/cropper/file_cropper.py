@@ -1,6 +1,6 @@
 from process.gt_reader.shp_reader import ShpReader
+from process.gt_reader.util import read_geometry_list
 from .base_cropper import BaseCropper
-from .util import read_geometry_list
 
 
 class FileCropper(BaseCropper):
@@ -1,21 +1,34 @@
+import numpy as np
+import shapely
 from osgeo import ogr
 
-from process.gt_reader.shp_reader import ShpReader
-from process.util import WindowArg, window2geom
+from process.gt_reader.score_reader import ScoreReader
+from process.util import WindowArg, window2bounds, ogr2shapely
 from .base_cropper import BaseCropper
 
 
 class ObjectOrientedCropper(BaseCropper):
     def __init__(self, image_height: int, image_width: int, window_size: int,
-                 geometry_list: list[ogr.Geometry], shp_reader: ShpReader):
+                 geometry_list: list[ogr.Geometry] | np.ndarray, shp_reader: ScoreReader):
         super().__init__(shp_reader)
 
         self.image_height = image_height
         self.image_width = image_width
         self.window_size = window_size
+        # geometries are converted once, windows are tested by bounds and rectangle clipping without ogr objects
+        if not isinstance(geometry_list, np.ndarray):
+            geometry_list = ogr2shapely(geometry_list)
         self.geometry_list = geometry_list
+        shapely.prepare(self.geometry_list)
+        self.geometry_areas = shapely.area(self.geometry_list)
+        self.geometry_bounds = shapely.bounds(self.geometry_list).reshape(-1, 4)
 
-        self.is_geom_skip = [False] * len(geometry_list)
+        self.is_geom_skip = np.zeros(len(geometry_list), dtype=bool)
+
+        # r-tree of geometry envelopes, a window only tests geometries whose envelopes intersect it
+        self.geometry_tree = shapely.STRtree(self.geometry_list)
+        # a geometry without area is always contained by the first window
+        self.zero_area_ids = np.flatnonzero(self.geometry_areas == 0)
 
     def get_window_and_check_bound(self, row_start: int, col_start: int):
         if (row_start + self.window_size) > self.image_height:
@@ -30,7 +43,7 @@ class ObjectOrientedCropper(BaseCropper):
         return WindowArg(row_start=row_start, row_end=row_start + self.window_size,
                          col_start=col_start, col_end=col_start + self.window_size)
 
-    def iter_small_geom(self, current_geometry: ogr.Geometry):
+    def iter_small_geom(self, current_geometry: shapely.Geometry):
         def iter_possible_windows(geom_window_: WindowArg):
             row_length_ = geom_window.row_end - geom_window.row_start
             col_length_ = geom_window.col_end - geom_window.col_start
@@ -57,7 +70,7 @@ class ObjectOrientedCropper(BaseCropper):
 
         best_score = None
         best_window = None
-        geom_window = self.get_geom_window(current_geometry)
+        geom_window = self.get_bounds_window(*current_geometry.bounds)
         for row_start, col_start in iter_possible_windows(geom_window):
             window = self.get_window_and_check_bound(row_start, col_start)
             score = self.shp_reader.get_window_score(window, current_geometry)
@@ -69,7 +82,7 @@ class ObjectOrientedCropper(BaseCropper):
         if best_window is not None:
             yield best_window
 
-    def iter_big_geom(self, current_geometry: ogr.Geometry):
+    def iter_big_geom(self, current_geometry: shapely.Geometry):
         def next_line(start_line_: int, end_line_: int, window_size_: int):
             length_ = end_line_ - start_line_
             if length_ <= window_size_:
@@ -81,7 +94,7 @@ class ObjectOrientedCropper(BaseCropper):
 
         row_buffer = self.window_size // 8
         col_buffer = self.window_size // 8
-        geom_window = self.get_geom_window(current_geometry)
+        geom_window = self.get_bounds_window(*current_geometry.bounds)
         for row_start in next_line(geom_window.row_start - row_buffer, geom_window.row_end + row_buffer,
                                    self.window_size):
             for col_start in next_line(geom_window.col_start - col_buffer, geom_window.col_end + col_buffer,
@@ -92,8 +105,8 @@ class ObjectOrientedCropper(BaseCropper):
                     continue
                 yield window
 
-    def iter_one_geom(self, current_geometry: ogr.Geometry):
-        geom_window = self.get_geom_window(current_geometry)
+    def iter_one_geom(self, current_geometry: shapely.Geometry):
+        geom_window = self.get_bounds_window(*current_geometry.bounds)
         row_length = geom_window.row_end - geom_window.row_start
         col_length = geom_window.col_end - geom_window.col_start
         if row_length <= self.window_size and col_length <= self.window_size:
@@ -102,24 +115,37 @@ class ObjectOrientedCropper(BaseCropper):
             yield from self.iter_big_geom(current_geometry)
 
     def check_which_geometry_is_contained(self, window: WindowArg):
-        window_geom = window2geom(self.shp_reader.affine_transform, window)
+        min_x, min_y, max_x, max_y = window2bounds(self.shp_reader.affine_transform, window)
+        candidate_ids = self.geometry_tree.query(shapely.box(min_x, min_y, max_x, max_y))
+        candidate_ids = np.union1d(candidate_ids, self.zero_area_ids)
+        self.zero_area_ids = self.zero_area_ids[:0]
+        candidate_ids = candidate_ids[~self.is_geom_skip[candidate_ids]]
+
+        # geometry inside window is covered totally, geometry crossing the window edge is clipped by it
+        bounds = self.geometry_bounds[candidate_ids]
+        is_inside = ((min_x <= bounds[:, 0]) & (min_y <= bounds[:, 1]) &
+                     (bounds[:, 2] <= max_x) & (bounds[:, 3] <= max_y))
+        intersection_areas = self.geometry_areas[candidate_ids]
+        intersection_areas[~is_inside] = shapely.area(shapely.clip_by_rect(
+            self.geometry_list[candidate_ids[~is_inside]], min_x, min_y, max_x, max_y))
+        is_contained = intersection_areas >= self.geometry_areas[candidate_ids] * 0.6
+        self.is_geom_skip[candidate_ids[is_contained]] = True
+
+    def iter_geometry_windows(self):
+        """Windows with the index of geometry they are cropped for."""
         for i, current_geometry in enumerate(self.geometry_list):
-            if self.is_geom_skip[i] is True:
-                continue
-            intersection = window_geom.Intersection(current_geometry)
-            if intersection.Area() >= current_geometry.Area() * 0.6:
-                self.is_geom_skip[i] = True
-
-    def __iter__(self):
-        geometry_id = 0
-        for i, current_geometry in enumerate(self.geometry_list):
-            geometry_id += 1
             if self.is_geom_skip[i]:
                 continue
-            window_id = 0
             for window in self.iter_one_geom(current_geometry):
                 self.check_which_geometry_is_contained(window)
-                window_id += 1
-                yield window, f"{geometry_id:02d}{window_id:02d}"
+                yield i, window
 
             self.is_geom_skip[i] = True
+
+    def __iter__(self):
+        last_i = None
+        window_id = 0
+        for i, window in self.iter_geometry_windows():
+            window_id = window_id + 1 if i == last_i else 1
+            last_i = i
+            yield window, f"{i + 1:02d}{window_id:02d}"
@@ -0,0 +1,143 @@
+import dataclasses
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from osgeo import ogr
+from rasterio.transform import Affine
+
+from process.gt_reader.score_reader import ScoreReader
+from process.util import WindowArg
+from .object_orient_cropper import ObjectOrientedCropper
+
+
+@dataclasses.dataclass
+class Partition:
+    row_start: int
+    col_start: int
+    data: np.ndarray
+    transform: Affine
+    window_size: int
+    geometry_ids: np.ndarray
+    geometries: np.ndarray
+
+
+def plan_partition(partition: Partition):
+    """Crop geometries of a partition in order on its own copy of score data, return windows of every geometry."""
+    score_reader = ScoreReader(partition.data, partition.transform)
+    _, height, width = partition.data.shape
+    cropper = ObjectOrientedCropper(height, width, partition.window_size, partition.geometries, score_reader)
+
+    # geometries covered by windows of other geometries have no plan
+    plans = {}
+    for i, current_geometry in enumerate(cropper.geometry_list):
+        if cropper.is_geom_skip[i]:
+            continue
+        windows = plans[int(partition.geometry_ids[i])] = []
+        for window in cropper.iter_one_geom(current_geometry):
+            cropper.check_which_geometry_is_contained(window)
+            score_reader.update_cropped_area(window)
+            windows.append(WindowArg(window.row_start + partition.row_start, window.row_end + partition.row_start,
+                                     window.col_start + partition.col_start, window.col_end + partition.col_start))
+        cropper.is_geom_skip[i] = True
+    return plans
+
+
+class PartitionedObjectCropper(ObjectOrientedCropper):
+    """Object oriented cropper planning windows of spatial blocks in a process pool.
+
+    A geometry belongs to the block holding the top left corner of its window. Windows of a geometry are within
+    window_size pixels of it, so every block is planned like the sequential cropper on a copy of score data
+    with a halo, and geometries larger than a quarter of block_size are planned in the merge.
+    The merge replays plans in the order of geometries: a planned window is kept if it still has a score on the
+    cropped area, and a geometry whose planned windows were all cropped by other blocks is planned again.
+    A geometry without any window in its block may have been cropped only by a window of the block, so it is
+    planned again once a planned window of its block is dropped.
+    Windows differ from the sequential cropper where a window of another block crops the area or covers a
+    geometry first, and the difference goes on in the block.
+    """
+    def __init__(self, image_height: int, image_width: int, window_size: int,
+                 geometry_list: list[ogr.Geometry] | np.ndarray, shp_reader: ScoreReader,
+                 block_size: int = 2048, max_workers: int = None):
+        super().__init__(image_height, image_width, window_size, geometry_list, shp_reader)
+        self.block_size = block_size
+        # larger geometries are planned in the merge, a block is copied with a halo of this size
+        self.max_geometry_size = block_size // 4
+        self.max_workers = max_workers if max_workers is not None else os.cpu_count()
+
+    def get_partitions(self):
+        if len(self.geometry_list) == 0:
+            return []
+        # windows of all geometries in one call of transformer, the same as get_bounds_window
+        count = len(self.geometry_list)
+        rows, cols = self.shp_reader.affine_transform.rowcol(
+            np.concatenate([self.geometry_bounds[:, 0], self.geometry_bounds[:, 2]]),
+            np.concatenate([self.geometry_bounds[:, 1], self.geometry_bounds[:, 3]]))
+        row_starts, row_ends = np.minimum(rows[:count], rows[count:]), np.maximum(rows[:count], rows[count:])
+        col_starts, col_ends = np.minimum(cols[:count], cols[count:]), np.maximum(cols[:count], cols[count:])
+        is_small = ((row_ends - row_starts <= self.max_geometry_size) &
+                    (col_ends - col_starts <= self.max_geometry_size))
+        block_rows = np.clip(row_starts, 0, self.image_height - 1) // self.block_size
+        block_cols = np.clip(col_starts, 0, self.image_width - 1) // self.block_size
+
+        blocks = {}
+        for i in np.flatnonzero(is_small):
+            blocks.setdefault((int(block_rows[i]), int(block_cols[i])), []).append(i)
+
+        partitions = []
+        for (block_row, block_col), geometry_ids in sorted(blocks.items()):
+            # geometries of block end max_geometry_size pixels out of it, windows reach window_size pixels farther
+            halo = self.max_geometry_size + self.window_size
+            row_start = max(block_row * self.block_size - self.window_size, 0)
+            row_end = min((block_row + 1) * self.block_size + halo, self.image_height)
+            col_start = max(block_col * self.block_size - self.window_size, 0)
+            col_end = min((block_col + 1) * self.block_size + halo, self.image_width)
+            data, transform = self.shp_reader.get_partition(row_start, row_end, col_start, col_end)
+            geometry_ids = np.array(geometry_ids)
+            partitions.append(Partition(row_start, col_start, data, transform, self.window_size, geometry_ids,
+                                        self.geometry_list[geometry_ids]))
+        return partitions
+
+    def plan(self):
+        """Planned windows of geometries, and the partition of every geometry planned in a partition."""
+        partitions = self.get_partitions()
+        if self.max_workers == 1 or len(partitions) <= 1:
+            results = map(plan_partition, partitions)
+        else:
+            with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                results = list(executor.map(plan_partition, partitions))
+
+        plans = {}
+        partition_ids = {}
+        for partition_id, (partition, result) in enumerate(zip(partitions, results)):
+            plans.update(result)
+            partition_ids.update((int(geometry_id), partition_id) for geometry_id in partition.geometry_ids)
+        return plans, partition_ids
+
+    def iter_geometry_windows(self):
+        plans, partition_ids = self.plan()
+        # partitions with a dropped window, area cropped by the window in partition is not cropped in scene
+        dropped_partition_ids = set()
+        for i, current_geometry in enumerate(self.geometry_list):
+            if self.is_geom_skip[i]:
+                continue
+            planned_windows = plans.get(i)
+            window_count = 0
+            for window in planned_windows or []:
+                # area of window may be cropped by a window of another block
+                if self.shp_reader.get_window_score(window, current_geometry) is None:
+                    dropped_partition_ids.add(partition_ids[i])
+                    continue
+                self.check_which_geometry_is_contained(window)
+                window_count += 1
+                yield i, window
+
+            # geometry larger than block or covered by a dropped window, its planned windows are all cropped,
+            # or it has no window in partition as a dropped window of the partition cropped it
+            if (planned_windows is None or (len(planned_windows) > 0 and window_count == 0) or
+                    (len(planned_windows) == 0 and partition_ids[i] in dropped_partition_ids)):
+                for window in self.iter_one_geom(current_geometry):
+                    self.check_which_geometry_is_contained(window)
+                    yield i, window
+
+            self.is_geom_skip[i] = True
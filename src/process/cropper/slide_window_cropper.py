@@ -1,41 +1,55 @@
+import numpy as np
+
 from process.gt_reader.shp_reader import ShpReader
+from process.integral_image import NodataIndex
 from process.util import WindowArg
 from .base_cropper import BaseCropper
 
 
 class SlideWindowCropper(BaseCropper):
     def __init__(self, image_height: int, image_width: int, window_size: int, overlap_size: int,
-                 shp_reader: ShpReader = None):
-        super().__init__(shp_reader)
+                 shp_reader: ShpReader = None, nodata_index: NodataIndex = None,
+                 drop_nodata_percentage: float = None):
+        super().__init__(shp_reader, nodata_index, drop_nodata_percentage)
         self.image_height = image_height
         self.image_width = image_width
         self.window_size = window_size
         self.overlap_size = overlap_size
 
-    def get_window_and_check_bound(self, row_start: int, col_start: int):
-        if (row_start + self.window_size) > self.image_height:
-            row_start = self.image_height - self.window_size
-        if (col_start + self.window_size) > self.image_width:
-            col_start = self.image_width - self.window_size
-        if row_start < 0:
-            row_start = 0
-        if col_start < 0:
-            col_start = 0
+    def get_starts(self, image_length: int):
+        real_window_size = self.window_size - self.overlap_size
+        count = (image_length - self.window_size) // real_window_size + 2
+        starts = np.arange(max(count, 0)) * real_window_size
+        starts = np.maximum(np.minimum(starts, image_length - self.window_size), 0)
+        # windows clamped to image edge are the same, the first of them is kept with its id
+        return np.unique(starts, return_index=True)
+
+    def get_window_plan(self):
+        """All windows in one array, a row is (row_start, row_end, col_start, col_end, row_id, col_id).
 
-        return WindowArg(row_start=row_start, row_end=row_start + self.window_size,
-                         col_start=col_start, col_end=col_start + self.window_size)
+        Windows with too much nodata, unsure pixels or without label are filtered in batch.
+        """
+        row_starts, row_ids = self.get_starts(self.image_height)
+        col_starts, col_ids = self.get_starts(self.image_width)
+        row_starts, col_starts = [starts.ravel() for starts in np.meshgrid(row_starts, col_starts, indexing="ij")]
+        row_ids, col_ids = [ids.ravel() for ids in np.meshgrid(row_ids, col_ids, indexing="ij")]
+        plan = np.stack([row_starts, row_starts + self.window_size, col_starts, col_starts + self.window_size,
+                         row_ids, col_ids], axis=1).astype(np.int64)
+
+        if self.nodata_index is not None and self.drop_nodata_percentage is not None:
+            nodata_percentages = self.nodata_index.get_nodata_percentages(plan[:, 0], plan[:, 1],
+                                                                          plan[:, 2], plan[:, 3])
+            plan = plan[nodata_percentages < self.drop_nodata_percentage]
+        if self.shp_reader is not None:
+            scores = self.shp_reader.get_window_scores(plan[:, 0], plan[:, 1], plan[:, 2], plan[:, 3])
+            plan = plan[scores > 0]
+        return plan
 
     def __iter__(self):
-        real_window_size = self.window_size - self.overlap_size
-        row_count = (self.image_height - self.window_size) // real_window_size + 2
-        col_count = (self.image_width - self.window_size) // real_window_size + 2
-
-        for row_id in range(row_count):
-            row_start = row_id * real_window_size
-            for col_id in range(col_count):
-                col_start = col_id * real_window_size
-                window_args = self.get_window_and_check_bound(row_start, col_start)
-                if self.shp_reader is not None and self.shp_reader.get_window_score(window_args) is None:
-                    continue
-                window_id = f"{row_id + 1:02}{col_id + 1:02}"
-                yield window_args, window_id
+        for row_start, row_end, col_start, col_end, row_id, col_id in self.get_window_plan().tolist():
+            window_args = WindowArg(row_start, row_end, col_start, col_end)
+            # area cropped by previous windows may drop this window
+            if self.shp_reader is not None and self.shp_reader.get_window_score(window_args) is None:
+                continue
+            window_id = f"{row_id + 1:02}{col_id + 1:02}"
+            yield window_args, window_id
@@ -1,2 +1,3 @@
 from .aws_downloader import AwsDownloader, AwsSentinel2L2aDownloader
+from .download_engine import DownloadEngine, DownloadTask
 from .util import sentinel2_l2a_bands
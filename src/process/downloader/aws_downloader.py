@@ -1,24 +1,33 @@
+import functools
 import os
-from urllib import request
 
 from pystac_client import Client
 
 from .base_downloader import BaseDownloader
+from .download_engine import DownloadEngine, DownloadTask
+from .item_cache import StacItemCache, StaticCatalogItems
 from .util import sentinel2_l2a_asset
 
 
 class AwsDownloader(BaseDownloader):
     aws_url = "https://earth-search.aws.element84.com/v1"
 
-    def __init__(self):
-        self.aws_client = Client.open(url=self.aws_url)
+    @functools.cached_property
+    def aws_client(self):
+        # open client only when a search is really needed
+        return Client.open(url=self.aws_url)
 
 
 class AwsSentinel2L2aDownloader(AwsDownloader):
     sentinel2_l2a_asset = sentinel2_l2a_asset
+    collection = "sentinel-2-l2a"
+    search_batch_size = 100
 
-    def __init__(self):
+    def __init__(self, max_workers: int = 8, item_cache_folder: str = None, static_catalog_path: str = None):
         super().__init__()
+        self.download_engine = DownloadEngine(max_workers=max_workers)
+        self.item_cache = StacItemCache(item_cache_folder) if item_cache_folder is not None else None
+        self.static_catalog = StaticCatalogItems(static_catalog_path) if static_catalog_path is not None else None
 
     def get_possible_item_ids(self, folder_name: str) -> list[str]:
         """Get possible item ids in aws downloader source
@@ -38,36 +47,112 @@ class AwsSentinel2L2aDownloader(AwsDownloader):
         else:
             return [folder_name]
 
-    def get_best_item(self, possible_product_ids: list[str]):
-        item_search = self.aws_client.search(collections="sentinel-2-l2a", ids=possible_product_ids)
+    @staticmethod
+    def choose_best_item(items: list):
         prefer_item = None
-        for item in item_search.item_collection():
+        for item in items:
             if prefer_item is None or item.id.endswith("0_L2A"):
                 prefer_item = item
         return prefer_item
 
-    def download_one_item_hrefs(self, downloaded_item, bands: list[str], download_folder: str):
-        os.makedirs(download_folder, exist_ok=True)
+    def search_items(self, item_ids: list[str]):
+        """Resolve item ids with as few search requests as possible
+
+        :param item_ids: item ids of all scenes
+        :return: {item_id: item} of ids that exist in aws source
+        """
+        items = {}
+        for i in range(0, len(item_ids), self.search_batch_size):
+            batch_ids = item_ids[i:i + self.search_batch_size]
+            item_search = self.aws_client.search(collections=self.collection, ids=batch_ids)
+            for item in item_search.items():
+                items[item.id] = item
+        return items
+
+    def get_best_items(self, folder_names: list[str]):
+        """Get best item of every scene folder
+
+        :param folder_names: such as [T47RPL_20211001T034549, S2A_49SGV_20211024_0_L2A]
+        :return: {folder_name: item}, folder without any accessible item is not included
+        """
+        possible_item_ids = {folder_name: self.get_possible_item_ids(folder_name) for folder_name in folder_names}
+
+        # 1. static catalog never searches
+        if self.static_catalog is not None:
+            get_item = self.static_catalog.get
+            searched_items = {}
+        else:
+            # all candidates of one scene are searched together, so if any of them is cached,
+            # the cache already holds every candidate that exists for this scene
+            get_item = self.item_cache.get if self.item_cache is not None else lambda item_id: None
+            uncached_ids = []
+            for item_ids in possible_item_ids.values():
+                if self.item_cache is None or not any(self.item_cache.contains(i) for i in item_ids):
+                    uncached_ids.extend(item_ids)
+            searched_items = self.search_items(uncached_ids) if len(uncached_ids) > 0 else {}
+            if self.item_cache is not None:
+                for item in searched_items.values():
+                    self.item_cache.put(item)
+
+        # 2. choose best item of every scene
+        best_items = {}
+        for folder_name, item_ids in possible_item_ids.items():
+            items = []
+            for item_id in item_ids:
+                item = searched_items[item_id] if item_id in searched_items else get_item(item_id)
+                if item is not None:
+                    items.append(item)
+            best_item = self.choose_best_item(items)
+            if best_item is not None:
+                best_items[folder_name] = best_item
+        return best_items
+
+    def get_best_item(self, possible_product_ids: list[str]):
+        items = self.search_items(possible_product_ids)
+        return self.choose_best_item([items[i] for i in possible_product_ids if i in items])
+
+    def get_one_item_download_tasks(self, downloaded_item, bands: list[str], download_folder: str):
         accessible_bands = set(self.sentinel2_l2a_asset.keys())
         assert set(bands).issubset(accessible_bands), \
             f"Accessible bands: {accessible_bands}, input bands {bands} are not all accessible"
+        tasks = []
         for band in bands:
             band_index = self.sentinel2_l2a_asset[band]
             href = downloaded_item.assets[band_index].href
             download_path = os.path.join(download_folder, f"{band}.tif")
             if os.path.exists(download_path):
                 continue
-            request.urlretrieve(href, download_path)
+            tasks.append(DownloadTask(href=href, download_path=download_path))
+        return tasks
 
-    def download_all_files(self, input_folder: str,  bands: list[str], download_sub_folder: str = None,):
-        # iter scenes
-        for folder_name in os.listdir(input_folder):
-            if not os.path.isdir(os.path.join(input_folder, folder_name)):
-                continue
+    def get_all_item_hrefs(self, input_folder: str, bands: list[str], best_items: dict = None):
+        """Get band hrefs of every scene folder for reading bands remotely
+
+        :param best_items: items returned by download_all_files, items are searched again if it is None
+        :return: {folder_name: [href of each band in bands]}
+        """
+        if best_items is None:
+            folder_names = [folder_name for folder_name in os.listdir(input_folder)
+                            if os.path.isdir(os.path.join(input_folder, folder_name))]
+            best_items = self.get_best_items(folder_names)
+        return {folder_name: [item.assets[self.sentinel2_l2a_asset[band]].href for band in bands]
+                for folder_name, item in best_items.items()}
 
-            item_ids = self.get_possible_item_ids(folder_name)
-            print(f"Possible downloaded item ids are: {item_ids}.")
-            downloaded_item = self.get_best_item(item_ids)
+    def download_one_item_hrefs(self, downloaded_item, bands: list[str], download_folder: str):
+        os.makedirs(download_folder, exist_ok=True)
+        tasks = self.get_one_item_download_tasks(downloaded_item, bands, download_folder)
+        self.download_engine.download(tasks)
+
+    def download_all_files(self, input_folder: str,  bands: list[str], download_sub_folder: str = None,):
+        # 1. resolve items of all scenes in batch
+        folder_names = [folder_name for folder_name in os.listdir(input_folder)
+                        if os.path.isdir(os.path.join(input_folder, folder_name))]
+        best_items = self.get_best_items(folder_names)
+
+        # 2. collect bands of all scenes, so that the thread pool works across bands and scenes
+        tasks = []
+        for folder_name in folder_names:
+            downloaded_item = best_items.get(folder_name)
             if downloaded_item is None:
                 print(f"Scene {folder_name} has no accessible items, skip.")
                 continue
@@ -77,4 +162,8 @@ class AwsSentinel2L2aDownloader(AwsDownloader):
                 download_folder = os.path.join(input_folder, folder_name)
             else:
                 download_folder = os.path.join(input_folder, folder_name, download_sub_folder)
-            self.download_one_item_hrefs(downloaded_item, bands, download_folder)
+            tasks.extend(self.get_one_item_download_tasks(downloaded_item, bands, download_folder))
+
+        # 3. download
+        self.download_engine.download(tasks)
+        return best_items
@@ -5,6 +5,12 @@ class BaseDownloader:
     def get_best_item(self, possible_product_ids: list[str]):
         raise NotImplementedError
 
+    def get_best_items(self, folder_names: list[str]):
+        raise NotImplementedError
+
+    def get_one_item_download_tasks(self, downloaded_item, bands: list[str], download_folder: str):
+        raise NotImplementedError
+
     def download_one_item_hrefs(self, downloaded_item, bands: list[str], download_folder: str):
         raise NotImplementedError
 
@@ -0,0 +1,165 @@
+import dataclasses
+import hashlib
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from requests.adapters import HTTPAdapter
+from tqdm import tqdm
+
+
+@dataclasses.dataclass
+class DownloadTask:
+    href: str
+    download_path: str
+
+
+class DownloadEngine:
+    """Download files on a bounded thread pool that shares one pool of HTTP connections.
+
+    Every file is written to ``<download_path>.part`` and renamed once its size (and MD5 ETag, when the
+    server returns one) is verified, so an existing ``download_path`` is always a complete file.
+    An interrupted ``.part`` file is resumed with an HTTP Range request on the next run.
+    A failed file is retried up to max_retries times, waiting backoff_factor * 2 ** (retry - 1) seconds before a
+    retry, and every retry resumes the ``.part`` file.
+    """
+    part_suffix = ".part"
+    etag_suffix = ".etag"
+    chunk_size = 1024 * 1024
+    backoff_factor = 1
+
+    def __init__(self, max_workers: int = 8, max_retries: int = 3, timeout: float = 60):
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.timeout = timeout
+
+        # retries are done by download_one only, which resumes from the part file
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers, max_retries=0)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    @staticmethod
+    def is_md5_etag(etag: str):
+        # multipart uploads have etag like "<md5 of md5s>-<part num>", which is not the md5 of file
+        return etag is not None and len(etag) == 32 and all(c in "0123456789abcdef" for c in etag.lower())
+
+    @staticmethod
+    def get_file_md5(file_path: str):
+        md5 = hashlib.md5()
+        with open(file_path, "rb") as file:
+            for chunk in iter(lambda: file.read(DownloadEngine.chunk_size), b""):
+                md5.update(chunk)
+        return md5.hexdigest()
+
+    def get_remote_size_and_etag(self, href: str):
+        response = self.session.head(href, allow_redirects=True, timeout=self.timeout)
+        response.raise_for_status()
+        content_length = response.headers.get("Content-Length")
+        total_size = int(content_length) if content_length is not None else None
+        etag = response.headers.get("ETag")
+        if etag is not None:
+            # weak etag keeps its W/ prefix, it is neither a md5 nor valid in If-Range
+            is_weak = etag.startswith("W/")
+            etag = etag.removeprefix("W/").strip('"')
+            if is_weak:
+                etag = f"W/{etag}"
+        return total_size, etag
+
+    @staticmethod
+    def is_weak_etag(etag: str):
+        return etag is not None and etag.startswith("W/")
+
+    def remove_part(self, part_path: str):
+        for path in [part_path, part_path + self.etag_suffix]:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def get_resume_offset(self, part_path: str, etag: str, total_size: int):
+        if not os.path.exists(part_path):
+            return 0
+        etag_path = part_path + self.etag_suffix
+        saved_etag = None
+        if os.path.exists(etag_path):
+            with open(etag_path, "r") as file:
+                saved_etag = file.read().strip() or None
+        # the remote file changed since the part file was started
+        if saved_etag != etag:
+            self.remove_part(part_path)
+            return 0
+        offset = os.path.getsize(part_path)
+        if total_size is not None and offset > total_size:
+            self.remove_part(part_path)
+            return 0
+        return offset
+
+    def fetch_to_part(self, href: str, part_path: str, etag: str, total_size: int):
+        offset = self.get_resume_offset(part_path, etag, total_size)
+        if offset == 0:
+            with open(part_path + self.etag_suffix, "w") as file:
+                file.write(etag or "")
+        if total_size is not None and offset == total_size:
+            return
+
+        headers = {}
+        if offset > 0:
+            headers["Range"] = f"bytes={offset}-"
+            # RFC 7233 does not allow a weak etag in If-Range, the part file is checked by size then
+            if etag is not None and not self.is_weak_etag(etag):
+                headers["If-Range"] = f'"{etag}"'
+
+        with self.session.get(href, headers=headers, stream=True, timeout=self.timeout) as response:
+            response.raise_for_status()
+            # 206 means the server accepts the range, otherwise it sends the whole file again
+            mode = "ab" if offset > 0 and response.status_code == 206 else "wb"
+            with open(part_path, mode) as file:
+                for chunk in response.iter_content(chunk_size=self.chunk_size):
+                    file.write(chunk)
+
+    def verify_part(self, part_path: str, etag: str, total_size: int):
+        part_size = os.path.getsize(part_path)
+        if total_size is not None and part_size != total_size:
+            raise IOError(f"Size of {part_path} is {part_size}, expected {total_size}.")
+        if self.is_md5_etag(etag) and self.get_file_md5(part_path) != etag.lower():
+            self.remove_part(part_path)
+            raise IOError(f"MD5 of {part_path} does not match ETag {etag}.")
+
+    def download_one(self, task: DownloadTask):
+        if os.path.exists(task.download_path):
+            return task.download_path
+
+        os.makedirs(os.path.dirname(task.download_path), exist_ok=True)
+        part_path = task.download_path + self.part_suffix
+
+        error = None
+        for retry in range(self.max_retries + 1):
+            if retry > 0:
+                time.sleep(self.backoff_factor * 2 ** (retry - 1))
+            try:
+                total_size, etag = self.get_remote_size_and_etag(task.href)
+                self.fetch_to_part(task.href, part_path, etag, total_size)
+                self.verify_part(part_path, etag, total_size)
+                break
+            except (requests.RequestException, IOError) as e:
+                error = e
+        else:
+            raise IOError(f"Download {task.href} failed: {error}")
+
+        os.replace(part_path, task.download_path)
+        self.remove_part(part_path)
+        return task.download_path
+
+    def download(self, tasks: list[DownloadTask]):
+        failed_tasks = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            future_to_task = {executor.submit(self.download_one, task): task for task in tasks}
+            for future in tqdm(as_completed(future_to_task), total=len(future_to_task), desc="Download"):
+                try:
+                    future.result()
+                except IOError as e:
+                    print(e)
+                    failed_tasks.append(future_to_task[future])
+
+        if len(failed_tasks) > 0:
+            raise IOError(f"{len(failed_tasks)} of {len(tasks)} files failed to download.")
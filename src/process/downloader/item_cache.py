@@ -0,0 +1,44 @@
+import json
+import os
+
+import pystac
+
+
+class StacItemCache:
+    """Persist resolved STAC items on local disk, one json file per item id."""
+
+    def __init__(self, cache_folder: str):
+        self.cache_folder = cache_folder
+        os.makedirs(cache_folder, exist_ok=True)
+
+    def get_item_path(self, item_id: str):
+        return os.path.join(self.cache_folder, f"{item_id}.json")
+
+    def contains(self, item_id: str):
+        return os.path.exists(self.get_item_path(item_id))
+
+    def get(self, item_id: str):
+        item_path = self.get_item_path(item_id)
+        if not os.path.exists(item_path):
+            return None
+        with open(item_path, "r") as file:
+            return pystac.Item.from_dict(json.load(file))
+
+    def put(self, item: pystac.Item):
+        # write to temp file first, other processes may read the cache at the same time
+        item_path = self.get_item_path(item.id)
+        temp_path = f"{item_path}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as file:
+            json.dump(item.to_dict(), file)
+        os.replace(temp_path, item_path)
+
+
+class StaticCatalogItems:
+    """Look up items in a static STAC catalog on local disk, without any search request."""
+
+    def __init__(self, catalog_path: str):
+        catalog = pystac.Catalog.from_file(catalog_path)
+        self.items = {item.id: item for item in catalog.get_items(recursive=True)}
+
+    def get(self, item_id: str):
+        return self.items.get(item_id)
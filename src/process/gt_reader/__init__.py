@@ -1 +1,2 @@
+from .score_reader import ScoreReader
 from .shp_reader import ShpReader
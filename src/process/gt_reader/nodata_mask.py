@@ -0,0 +1,70 @@
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import rasterio
+from rasterio import features
+
+from .util import remove_stale_cache
+
+
+def sieve_tile(halo_valid: np.ndarray, size: int, row_start: int, row_end: int, col_start: int, col_end: int):
+    """Sieve one tile with a halo of size pixels, and return its core at rows and columns relative to the halo.
+
+    A region of less than size pixels can not reach the halo border, so it is sieved the same as in whole image,
+    and a region cut by the halo border has at least size pixels inside the halo, so it is kept as in whole image.
+    """
+    sieved = features.sieve(halo_valid, size=size)
+    return sieved[row_start:row_end, col_start:col_end]
+
+
+def sieve_nodata_mask(band: np.ndarray, size: int = 500, tile_size: int = 4096, max_workers: int = None):
+    """Nodata mask of band with nodata and valid regions of less than size pixels removed.
+
+    sieve holds the GIL, so tiles are sieved in a process pool, and each process gets only its tile with halo.
+    """
+    valid = (band != 0).view(np.uint8)
+    height, width = valid.shape
+    max_workers = max_workers if max_workers is not None else os.cpu_count()
+    # halo costs more than it saves without parallel
+    if max_workers == 1 or (height <= tile_size and width <= tile_size):
+        return features.sieve(valid, size=size) == 0
+
+    tiles = [(row_start, min(row_start + tile_size, height), col_start, min(col_start + tile_size, width))
+             for row_start in range(0, height, tile_size) for col_start in range(0, width, tile_size)]
+
+    nodata_mask = np.empty(shape=(height, width), dtype=bool)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = []
+        for row_start, row_end, col_start, col_end in tiles:
+            halo_row_start, halo_row_end = max(row_start - size, 0), min(row_end + size, height)
+            halo_col_start, halo_col_end = max(col_start - size, 0), min(col_end + size, width)
+            futures.append(executor.submit(sieve_tile, valid[halo_row_start:halo_row_end, halo_col_start:halo_col_end],
+                                           size, row_start - halo_row_start, row_end - halo_row_start,
+                                           col_start - halo_col_start, col_end - halo_col_start))
+        for (row_start, row_end, col_start, col_end), future in zip(tiles, futures):
+            nodata_mask[row_start:row_end, col_start:col_end] = future.result() == 0
+    return nodata_mask
+
+
+def read_nodata_mask(sat_tif_path: str, cache_folder: str, size: int = 500):
+    """Read sieved nodata mask of sat image, it is cached by the path, mtime and size of sat image."""
+    stat = os.stat(sat_tif_path)
+    key = hashlib.sha256(f"{os.path.abspath(sat_tif_path)}:{stat.st_mtime_ns}:{stat.st_size}:{size}".encode())
+    cache_path = os.path.join(cache_folder, f"nodata_mask_{key.hexdigest()}.npz")
+    if os.path.exists(cache_path):
+        with np.load(cache_path) as cache:
+            shape = tuple(cache["shape"])
+            return np.unpackbits(cache["mask"], count=shape[0] * shape[1]).reshape(shape).view(bool)
+
+    with rasterio.open(sat_tif_path) as src:
+        band = src.read(1)
+    nodata_mask = sieve_nodata_mask(band, size)
+
+    os.makedirs(cache_folder, exist_ok=True)
+    temp_path = f"{cache_path}.{os.getpid()}.tmp.npz"
+    np.savez(temp_path, mask=np.packbits(nodata_mask), shape=np.array(nodata_mask.shape))
+    os.replace(temp_path, cache_path)
+    remove_stale_cache(cache_folder, "nodata_mask_*.npz", keep_path=cache_path)
+    return nodata_mask
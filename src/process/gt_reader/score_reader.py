@@ -0,0 +1,58 @@
+import numpy as np
+import shapely
+from rasterio.transform import Affine, AffineTransformer
+
+from process.util import WindowArg, window2bounds
+from .window_score_index import WindowScoreIndex
+
+
+class ScoreReader:
+    """Score windows by labelled and unsure pixels of score data, cropped area is not counted by later windows."""
+    cropped_value = 254
+    unsure_value = 255
+
+    def __init__(self, data_for_score: np.ndarray, transform: Affine):
+        self.data_for_score = data_for_score
+        self.transform = transform
+        self.affine_transform = AffineTransformer(transform)
+        # window score is counted by index, which is updated with data_for_score
+        self.score_index = WindowScoreIndex(data_for_score, self.unsure_value)
+
+    def is_window_intersect(self, window_arg: WindowArg, geometry: shapely.Geometry):
+        # reject or accept by bounds in crs first, only a geometry crossing the window edge is tested exactly
+        min_x, min_y, max_x, max_y = window2bounds(self.affine_transform, window_arg)
+        geom_min_x, geom_min_y, geom_max_x, geom_max_y = geometry.bounds
+        if geom_min_x > max_x or geom_max_x < min_x or geom_min_y > max_y or geom_max_y < min_y:
+            return False
+        if min_x <= geom_min_x and geom_max_x <= max_x and min_y <= geom_min_y and geom_max_y <= max_y:
+            return not geometry.is_empty
+        return shapely.intersects(geometry, shapely.box(min_x, min_y, max_x, max_y))
+
+    def get_window_score(self, window_arg: WindowArg, current_geometry: shapely.Geometry = None):
+        labelled_count, unsure_count = self.score_index.count(window_arg)
+        # 1.if contains unsure value, drop window
+        if unsure_count > 0:
+            return None
+        # 2.if not contain the current geometry, drop window
+        if current_geometry is not None and not self.is_window_intersect(window_arg, current_geometry):
+            return None
+        # 3.if not contain any un cropped pixel, drop window
+        if labelled_count == 0:
+            return None
+        else:
+            return int(labelled_count)
+
+    def get_window_scores(self, row_starts: np.ndarray, row_ends: np.ndarray,
+                          col_starts: np.ndarray, col_ends: np.ndarray):
+        """Scores of many windows at once without geometry check, 0 means the window is dropped."""
+        labelled_counts, unsure_counts = self.score_index.count_batch(row_starts, row_ends, col_starts, col_ends)
+        return np.where(unsure_counts > 0, 0, labelled_counts)
+
+    def update_cropped_area(self, window_arg: WindowArg):
+        # update
+        self.score_index.assign(window_arg, self.cropped_value)
+
+    def get_partition(self, row_start: int, row_end: int, col_start: int, col_end: int):
+        """Copy of score data in area with its transform, a score reader of the copy scores windows of the area."""
+        data = self.data_for_score[:, row_start:row_end, col_start:col_end].copy()
+        return data, self.transform * Affine.translation(col_start, row_start)
@@ -3,104 +3,120 @@ import os
 
 import numpy as np
 import rasterio
-from einops import reduce
-from osgeo import ogr
-from rasterio import features
 from rasterio.windows import Window
 
 from process.util import WindowArg, window2geom
-from .util import rasterize_shapefiles
+from process.writer import BaseWriter, GeoTiffWriter
+from .nodata_mask import read_nodata_mask
+from .score_reader import ScoreReader
+from .util import rasterize_shapefiles_in_memory, get_rasterize_cache_key, remove_stale_cache, read_geometry_list
 
 
-class ShpReader:
+class ShpReader(ScoreReader):
     negative_value = 99
-    cropped_value = 254
-    unsure_value = 255
 
     def __init__(self, sat_tif_path: str, rasterize_output_folder: str,
                  label_path_list_in_one_scene: list[str] = None, burn_values: list[int] = None,
-                 false_path_in_one_scene: str = None, unsure_file_path_in_one_scene: str = None):
+                 false_path_in_one_scene: str = None, unsure_file_path_in_one_scene: str = None,
+                 writer: BaseWriter = None):
+        self.writer = writer if writer is not None else GeoTiffWriter()
 
-        # rasterize shapefiles for output
         if label_path_list_in_one_scene is None:
             label_path_list_in_one_scene = []
             burn_values = []
-            self.data, self.profile = self.read_zero_data_and_profile(sat_tif_path)
-        else:
-            rasterize_output_path = os.path.join(rasterize_output_folder, "rasterize.tif")
-            rasterize_shapefiles(label_path_list_in_one_scene, burn_values, sat_tif_path, rasterize_output_path)
-            self.data, self.profile = self.read_data_and_profile(rasterize_output_path)
-
-        # rasterize shapefiles for score window
+        # label geometries are loaded on first use and shared by croppers
+        self.label_paths = list(label_path_list_in_one_scene)
+        self.geometry_list = None
+        extra_paths = []
+        extra_values = []
         if false_path_in_one_scene is not None:
-            label_path_list_in_one_scene.append(false_path_in_one_scene)
-            burn_values.append(self.negative_value)
+            extra_paths.append(false_path_in_one_scene)
+            extra_values.append(self.negative_value)
         if unsure_file_path_in_one_scene is not None:
-            label_path_list_in_one_scene.append(unsure_file_path_in_one_scene)
-            burn_values.append(self.unsure_value)
-        rasterize_output_path_for_score = os.path.join(rasterize_output_folder, "rasterize_backup.tif")
-        rasterize_shapefiles(label_path_list_in_one_scene, burn_values, sat_tif_path, rasterize_output_path_for_score)
-        self.data_for_score = self.read_data_for_score(rasterize_output_path_for_score, sat_tif_path)
+            extra_paths.append(unsure_file_path_in_one_scene)
+            extra_values.append(self.unsure_value)
+
+        # 1. rasterize label shapefiles for output, score data is label data with false and unsure area
+        self.profile = self.read_profile(sat_tif_path)
+        self.data, data_for_score = self.read_data_with_cache(label_path_list_in_one_scene, burn_values,
+                                                              extra_paths, extra_values, sat_tif_path,
+                                                              rasterize_output_folder)
+
+        # 2. nodata area of sat image is unsure
+        data_for_score = self.read_data_for_score(data_for_score, sat_tif_path, rasterize_output_folder)
 
         # read window transform and affine transform
         with rasterio.open(sat_tif_path) as src:
             self.epsg = src.crs.to_epsg()
             self.window_transform = src.window_transform
-            self.affine_transform = rasterio.transform.AffineTransformer(src.transform)
+            super().__init__(data_for_score, src.transform)
 
-    def read_zero_data_and_profile(self, sat_tif_path: str):
+    @staticmethod
+    def read_profile(sat_tif_path: str):
         with rasterio.open(sat_tif_path) as src:
-            data = np.zeros(shape=(1, src.height, src.width), dtype=np.uint8)
-            profile = src.profile
-        return data, profile
-
-    def read_data_and_profile(self, rasterize_path: str):
-        with rasterio.open(rasterize_path) as src:
-            data = src.read()
             profile = src.profile
-
-        data = reduce(data, "c h w -> 1 h w", "max")
-        return data, profile
-
-    def read_data_for_score(self, rasterize_path: str, sat_tif_path: str):
-        with rasterio.open(rasterize_path) as src:
-            data = src.read()
-            data = reduce(data, "c h w -> 1 h w", "max")
-        # update mask area
-        with rasterio.open(sat_tif_path) as src:
-            sat_shape = src.shape
-            sat_mask = np.ones(sat_shape, np.uint8) * 255
-            # nodata area
-            sat_mask[src.read(1) == 0] = 0
-            sat_mask = features.sieve(sat_mask, size=500)
-        # nodata area is unsure
-        data[:, sat_mask == 0] = self.unsure_value
-        return data
-
-    def get_window_score(self, window_arg: WindowArg, current_geometry: ogr.Geometry = None):
-        data = self.data_for_score[:, window_arg.row_start:window_arg.row_end, window_arg.col_start:window_arg.col_end]
-        # 1.if contains unsure value, drop window
-        if np.isin(self.unsure_value, data):
-            return None
-        window_geom = window2geom(self.affine_transform, window_arg)
-        # 2.if not contain the current geometry, drop window
-        if current_geometry is not None and not current_geometry.Intersect(window_geom):
-            return None
-        # 3.if not contain any un cropped pixel, drop window
-        score = np.sum(np.logical_and(0 < data, data < 100))
-        if score == 0:
-            return None
+        profile.update(count=1, dtype=rasterio.uint8, nodata=None, compress="lzw")
+        return profile
+
+    def rasterize(self, label_paths: list[str], burn_values: list[int], extra_paths: list[str],
+                  extra_values: list[int], sat_tif_path: str):
+        # all shapefiles are burned into one band in memory
+        if len(label_paths) == 0:
+            data = np.zeros(shape=(1, self.profile["height"], self.profile["width"]), dtype=np.uint8)
         else:
-            return score
-
-    def update_cropped_area(self, window_arg: WindowArg):
-        # update
-        self.data_for_score[:, window_arg.row_start:window_arg.row_end,
-        window_arg.col_start:window_arg.col_end] = self.cropped_value
+            data = rasterize_shapefiles_in_memory(label_paths, burn_values, sat_tif_path)[np.newaxis]
+        data_for_score = data.copy()
+        if len(extra_paths) > 0:
+            np.maximum(data_for_score, rasterize_shapefiles_in_memory(extra_paths, extra_values, sat_tif_path),
+                       out=data_for_score)
+        return data, data_for_score
+
+    def read_data_with_cache(self, label_paths: list[str], burn_values: list[int], extra_paths: list[str],
+                             extra_values: list[int], sat_tif_path: str, rasterize_output_folder: str):
+        """Rasterized data is cached by the content of shapefiles, burn values and grid of sat image."""
+        if len(label_paths) == 0 and len(extra_paths) == 0:
+            return self.rasterize(label_paths, burn_values, extra_paths, extra_values, sat_tif_path)
+
+        key = get_rasterize_cache_key(label_paths, burn_values, sat_tif_path, extra_paths, extra_values)
+        cache_path = os.path.join(rasterize_output_folder, f"rasterize_{key}.npz")
+        if os.path.exists(cache_path):
+            with np.load(cache_path) as cache:
+                return cache["data"], cache["data_for_score"]
+
+        data, data_for_score = self.rasterize(label_paths, burn_values, extra_paths, extra_values, sat_tif_path)
+        os.makedirs(rasterize_output_folder, exist_ok=True)
+        temp_path = f"{cache_path}.{os.getpid()}.tmp.npz"
+        np.savez_compressed(temp_path, data=data, data_for_score=data_for_score)
+        os.replace(temp_path, cache_path)
+        # labels of this scene are changed, old rasterization will not be used again
+        remove_stale_cache(rasterize_output_folder, "rasterize_*.npz", keep_path=cache_path)
+        return data, data_for_score
+
+    def read_data_for_score(self, data: np.ndarray, sat_tif_path: str, rasterize_output_folder: str):
+        # nodata area is unsure, mask is sieved in tiles and cached next to rasterization
+        nodata_mask = read_nodata_mask(sat_tif_path, rasterize_output_folder, size=500)
+        data[:, nodata_mask] = self.unsure_value
+        return data
 
-    def crop_data(self, window_arg: WindowArg, output_path: str, window_id: str):
+    def get_geometry_list(self):
+        """Label geometries intersecting the scene, read through a spatial filter of the scene footprint."""
+        if self.geometry_list is None:
+            scene_geometry = window2geom(self.affine_transform,
+                                         WindowArg(0, self.profile["height"], 0, self.profile["width"]))
+            self.geometry_list = []
+            for label_path in self.label_paths:
+                self.geometry_list.extend(read_geometry_list(label_path, scene_geometry))
+        return self.geometry_list
+
+    def save_label(self, output_path: str):
+        """Save label of the whole scene in one band, virtual dataset reads windows from it."""
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        profile = copy.copy(self.profile)
+        profile.update(count=1, dtype=rasterio.uint8, compress="lzw", tiled=True, blockxsize=256, blockysize=256)
+        with rasterio.open(output_path, "w", **profile) as dst:
+            dst.write(self.data)
 
+    def read_crop(self, window_arg: WindowArg):
         window = Window.from_slices(slice(window_arg.row_start, window_arg.row_end),
                                     slice(window_arg.col_start, window_arg.col_end))
         dst_transform = self.window_transform(window)
@@ -114,7 +130,10 @@ class ShpReader:
                        transform=dst_transform,
                        )
         dst_data = self.data[:, window_arg.row_start:window_arg.row_end, window_arg.col_start:window_arg.col_end]
-        with rasterio.open(output_path, "w", **profile) as dst:
-            dst.write(dst_data)
+        return dst_data, profile
+
+    def crop_data(self, window_arg: WindowArg, output_path: str, window_id: str):
+        dst_data, profile = self.read_crop(window_arg)
+        self.writer.write(output_path, dst_data, profile, window_arg)
 
         self.update_cropped_area(window_arg)
@@ -1,35 +1,184 @@
+import glob
+import hashlib
 import os
 
-from osgeo import gdal, ogr
+import geopandas
+import rasterio
+from osgeo import gdal, ogr, osr
 
 gdal.UseExceptions()
 
 
-def rasterize_shapefiles(shp_paths: list[str], burn_values: list[int], tif_path: str, output_path: str):
-    assert len(shp_paths) == len(burn_values), "shp num should be corresponding to value num"
-    shp_num = len(shp_paths)
+def rasterize_shapefiles_in_memory(shp_paths: list[str], burn_values: list[int], tif_path: str):
+    """Burn all label files into one uint8 band in memory, the max burn value is kept where labels overlap.
 
-    # read shapefile data
-    shp_driver = ogr.GetDriverByName("ESRI Shapefile")
+    Label files are burned in ascending order of burn value, so a later burn always overwrites a smaller value.
+    """
+    assert len(shp_paths) == len(burn_values), "shp num should be corresponding to value num"
 
-    # read tif data
     tif_dst = gdal.Open(tif_path)
-
-    # create output file
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    tif_driver = gdal.GetDriverByName("GTiff")
-    out_dst = tif_driver.Create(utf8_path=output_path, xsize=tif_dst.RasterXSize,
-                                ysize=tif_dst.RasterYSize, bands=shp_num, eType=gdal.GDT_Byte, options=["COMPRESS=LZW"])
-
-    # copy CRS and Transform
+    footprint = get_raster_footprint(tif_dst)
+    mem_driver = gdal.GetDriverByName("MEM")
+    out_dst = mem_driver.Create("", xsize=tif_dst.RasterXSize, ysize=tif_dst.RasterYSize, bands=1,
+                                eType=gdal.GDT_Byte)
     out_dst.SetProjection(tif_dst.GetProjection())
     out_dst.SetGeoTransform(tif_dst.GetGeoTransform())
     tif_dst = None
 
-    for i, (shp_path, burn_value) in enumerate(zip(shp_paths, burn_values), start=1):
-        shp_dst = shp_driver.Open(shp_path, 0)
-        shp_layer = shp_dst.GetLayer()
-        gdal.RasterizeLayer(dataset=out_dst, bands=[i], layer=shp_layer, burn_values=[burn_value])
+    for burn_value, shp_path in sorted(zip(burn_values, shp_paths)):
+        shp_dst, shp_layer = open_vector_layer(shp_path, footprint)
+        gdal.RasterizeLayer(dataset=out_dst, bands=[1], layer=shp_layer, burn_values=[burn_value])
         shp_dst = None
 
+    data = out_dst.GetRasterBand(1).ReadAsArray()
     out_dst = None
+    return data
+
+
+def get_raster_footprint(tif_dst: gdal.Dataset):
+    # geo transform of north up image: (min_x, x_res, 0, max_y, 0, -y_res)
+    x, x_res, _, y, _, y_res = tif_dst.GetGeoTransform()
+    x_end, y_end = x + x_res * tif_dst.RasterXSize, y + y_res * tif_dst.RasterYSize
+    min_x, max_x, min_y, max_y = min(x, x_end), max(x, x_end), min(y, y_end), max(y, y_end)
+    return ogr.CreateGeometryFromWkt(f"POLYGON (({min_x} {min_y}, {min_x} {max_y}, {max_x} {max_y}, {max_x} {min_y}, "
+                                     f"{min_x} {min_y}))")
+
+
+def create_spatial_index(shp_path: str):
+    """Create .qix index of shapefile, unless it already has a .qix or .sbn index."""
+    shp_base_path = os.path.splitext(shp_path)[0]
+    if any(os.path.exists(shp_base_path + extension) for extension in [".qix", ".sbn", ".QIX", ".SBN"]):
+        return
+    try:
+        shp_dst = ogr.Open(shp_path, 1)
+        # ogr.Open returns None instead of raising unless ogr exceptions are used
+        if shp_dst is None:
+            return
+        layer_name = shp_dst.GetLayer().GetName()
+        shp_dst.ExecuteSQL(f'CREATE SPATIAL INDEX ON "{layer_name}"')
+        shp_dst = None
+    except RuntimeError:
+        # shapefile in read only folder is filtered without index
+        pass
+
+
+label_extensions = [".shp", ".fgb", ".parquet"]
+
+
+def read_parquet_to_memory(parquet_path: str, filter_geometry: ogr.Geometry = None):
+    """Read GeoParquet by geopandas into a memory layer, for GDAL built without the Parquet driver.
+
+    Row groups are skipped by the bbox covering column, which is written by merge_labels.
+    """
+    bbox = None
+    if filter_geometry is not None:
+        min_x, max_x, min_y, max_y = filter_geometry.GetEnvelope()
+        bbox = (min_x, min_y, max_x, max_y)
+    try:
+        gdf = geopandas.read_parquet(parquet_path, bbox=bbox)
+    except ValueError:
+        # file without bbox covering column is read fully and filtered by the memory layer
+        gdf = geopandas.read_parquet(parquet_path)
+
+    mem_dst = ogr.GetDriverByName("Memory").CreateDataSource("")
+    srs = None
+    if gdf.crs is not None:
+        srs = osr.SpatialReference()
+        srs.ImportFromWkt(gdf.crs.to_wkt())
+    mem_layer = mem_dst.CreateLayer(os.path.splitext(os.path.basename(parquet_path))[0], srs, ogr.wkbUnknown)
+    for wkb in gdf.geometry.dropna().to_wkb():
+        feature = ogr.Feature(mem_layer.GetLayerDefn())
+        feature.SetGeometry(ogr.CreateGeometryFromWkb(wkb))
+        mem_layer.CreateFeature(feature)
+    return mem_dst, mem_layer
+
+
+def open_vector_layer(vector_path: str, filter_geometry: ogr.Geometry = None):
+    """Open first layer of a shapefile, FlatGeobuf or GeoParquet file, filtered by filter_geometry.
+
+    The filter is pushed down to OGR, which skips features by the .qix/.sbn index of shapefile, the packed
+    R-tree of FlatGeobuf or the bbox statistics of GeoParquet row groups.
+    Return the dataset with its layer, the layer is valid while the dataset is referenced.
+    """
+    extension = os.path.splitext(vector_path)[1].lower()
+    if extension == ".shp" and filter_geometry is not None:
+        create_spatial_index(vector_path)
+
+    if extension == ".parquet" and gdal.GetDriverByName("Parquet") is None:
+        vector_dst, vector_layer = read_parquet_to_memory(vector_path, filter_geometry)
+    else:
+        vector_dst = ogr.Open(vector_path, 0)
+        vector_layer = vector_dst.GetLayer()
+    if filter_geometry is not None:
+        vector_layer.SetSpatialFilter(filter_geometry)
+    return vector_dst, vector_layer
+
+
+def read_geometry_list(vector_path: str, filter_geometry: ogr.Geometry = None):
+    """Read geometries of a label or window file intersecting filter_geometry, attributes are not read."""
+    vector_dst, vector_layer = open_vector_layer(vector_path, filter_geometry)
+    layer_defn = vector_layer.GetLayerDefn()
+    field_names = [layer_defn.GetFieldDefn(i).GetName() for i in range(layer_defn.GetFieldCount())]
+    vector_layer.SetIgnoredFields(field_names + ["OGR_STYLE"])
+
+    geometry_list = []
+    for feature in vector_layer:
+        geometry = feature.GetGeometryRef()
+        if geometry is not None:
+            geometry_list.append(geometry.Clone())
+    vector_dst = None
+    return geometry_list
+
+
+def find_label_files(folder: str):
+    label_paths = []
+    for extension in label_extensions:
+        label_paths.extend(sorted(glob.glob(os.path.join(folder, f"*{extension}"))))
+
+    # a merged file left beside its shapefiles would burn every label twice
+    extensions = {os.path.splitext(label_path)[1] for label_path in label_paths}
+    if ".shp" in extensions and len(extensions) > 1:
+        raise ValueError(f"{folder} mixes shapefiles with merged {sorted(extensions - {'.shp'})} files, "
+                         f"keep either the shapefiles or the merged file")
+    return label_paths
+
+
+shapefile_sidecar_extensions = [".shp", ".shx", ".dbf", ".prj", ".cpg"]
+
+
+def get_vector_file_paths(vector_path: str):
+    # shapefile is stored in several sidecar files, FlatGeobuf and GeoParquet in one file
+    if os.path.splitext(vector_path)[1].lower() != ".shp":
+        return [vector_path]
+    paths = [os.path.splitext(vector_path)[0] + extension for extension in shapefile_sidecar_extensions]
+    return [path for path in paths if os.path.exists(path)]
+
+
+def get_rasterize_cache_key(shp_paths: list[str], burn_values: list[int], tif_path: str,
+                            extra_paths: list[str] = (), extra_values: list[int] = ()):
+    """Hash of label file contents with shapefile sidecars, burn values and target grid of tif_path.
+
+    Extra label files are only burned into score raster, so they are hashed apart from label shapefiles.
+    """
+    sha256 = hashlib.sha256()
+    for kind, paths, values in [("label", shp_paths, burn_values), ("extra", extra_paths, extra_values)]:
+        # rasterization does not depend on the order of shapefiles
+        for shp_path, burn_value in sorted(zip(paths, values)):
+            sha256.update(f"{kind}:{burn_value}".encode())
+            for path in get_vector_file_paths(shp_path):
+                sha256.update(os.path.splitext(path)[1].encode())
+                with open(path, "rb") as file:
+                    for chunk in iter(lambda: file.read(1024 ** 2), b""):
+                        sha256.update(chunk)
+
+    with rasterio.open(tif_path) as src:
+        crs = src.crs.to_wkt() if src.crs is not None else None
+        sha256.update(f"grid:{list(src.transform)[:6]}:{src.height}:{src.width}:{crs}".encode())
+    return sha256.hexdigest()
+
+
+def remove_stale_cache(cache_folder: str, pattern: str, keep_path: str):
+    for path in glob.glob(os.path.join(cache_folder, pattern)):
+        # temp file may be being written by another process
+        if path != keep_path and ".tmp" not in os.path.basename(path):
+            os.remove(path)
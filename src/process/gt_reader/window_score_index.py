@@ -0,0 +1,116 @@
+import numpy as np
+
+from process.integral_image import IntegralImage
+from process.util import WindowArg
+
+
+class WindowScoreIndex:
+    """Count labelled and unsure pixels of a window without scanning all of its pixels.
+
+    Pixel counts are kept per block, per block row segment of every pixel row and per block column segment
+    of every pixel column. A window is the sum of its inner blocks, the row and column segments of its edge
+    strips and the pixels of its four corners. Pixels are assigned a value by assign, which updates the
+    counts of touched blocks only.
+    """
+    def __init__(self, data: np.ndarray, unsure_value: int, block_size: int = 16):
+        # data in shape (1 h w) is shared, assign updates it in place
+        self.data = data[0]
+        self.unsure_value = unsure_value
+        self.block_size = block_size
+        self.height, self.width = self.data.shape
+        block_rows = -(-self.height // block_size)
+        block_cols = -(-self.width // block_size)
+        self.block_counts = np.zeros(shape=(2, block_rows, block_cols), dtype=np.int32)
+        self.row_counts = np.zeros(shape=(2, self.height, block_cols), dtype=np.uint16)
+        self.col_counts = np.zeros(shape=(2, block_rows, self.width), dtype=np.uint16)
+        self.refresh(0, self.height, 0, self.width)
+
+    def get_masks(self, data: np.ndarray):
+        # 1. labelled pixels are not cropped, false or unsure, 2. unsure pixels
+        return np.stack([np.logical_and(0 < data, data < 100), data == self.unsure_value])
+
+    def refresh(self, row_start: int, row_end: int, col_start: int, col_end: int):
+        """Recount blocks touched by the area."""
+        size = self.block_size
+        block_row_start, block_row_end = row_start // size, -(-row_end // size)
+        block_col_start, block_col_end = col_start // size, -(-col_end // size)
+        row_start, row_end = block_row_start * size, min(block_row_end * size, self.height)
+        col_start, col_end = block_col_start * size, min(block_col_end * size, self.width)
+
+        # pad the last blocks on image edge to full block size
+        masks = np.zeros(shape=(2, (block_row_end - block_row_start) * size, (block_col_end - block_col_start) * size),
+                         dtype=np.uint16)
+        masks[:, :row_end - row_start, :col_end - col_start] = self.get_masks(
+            self.data[row_start:row_end, col_start:col_end])
+
+        row_counts = masks.reshape(2, masks.shape[1], -1, size).sum(axis=3, dtype=np.uint16)
+        col_counts = masks.reshape(2, -1, size, masks.shape[2]).sum(axis=2, dtype=np.uint16)
+        self.row_counts[:, row_start:row_end, block_col_start:block_col_end] = row_counts[:, :row_end - row_start]
+        self.col_counts[:, block_row_start:block_row_end, col_start:col_end] = col_counts[:, :, :col_end - col_start]
+        self.block_counts[:, block_row_start:block_row_end, block_col_start:block_col_end] = \
+            row_counts.reshape(2, -1, size, row_counts.shape[2]).sum(axis=2)
+
+    def assign(self, window_arg: WindowArg, value: int):
+        self.data[window_arg.row_start:window_arg.row_end, window_arg.col_start:window_arg.col_end] = value
+        self.refresh(window_arg.row_start, window_arg.row_end, window_arg.col_start, window_arg.col_end)
+
+    def count_pixels(self, row_start: int, row_end: int, col_start: int, col_end: int):
+        data = self.data[row_start:row_end, col_start:col_end]
+        if data.size == 0:
+            return np.zeros(2, dtype=np.int64)
+        labelled_count = data.size - np.count_nonzero(data == 0) - np.count_nonzero(data >= 100)
+        return np.array([labelled_count, np.count_nonzero(data == self.unsure_value)], dtype=np.int64)
+
+    def count(self, window_arg: WindowArg):
+        """Count of labelled and unsure pixels in window."""
+        size = self.block_size
+        row_start, row_end = max(window_arg.row_start, 0), min(window_arg.row_end, self.height)
+        col_start, col_end = max(window_arg.col_start, 0), min(window_arg.col_end, self.width)
+        # blocks fully inside window
+        block_row_start, block_row_end = -(-row_start // size), row_end // size
+        block_col_start, block_col_end = -(-col_start // size), col_end // size
+        if block_row_start >= block_row_end or block_col_start >= block_col_end:
+            return self.count_pixels(row_start, row_end, col_start, col_end)
+
+        inner_row_start, inner_row_end = block_row_start * size, block_row_end * size
+        inner_col_start, inner_col_end = block_col_start * size, block_col_end * size
+
+        inner_block_counts = self.block_counts[:, block_row_start:block_row_end, block_col_start:block_col_end]
+        counts = inner_block_counts.sum(axis=(1, 2), dtype=np.int64)
+        # top and bottom strips by row segments
+        for strip_start, strip_end in [(row_start, inner_row_start), (inner_row_end, row_end)]:
+            strip_counts = self.row_counts[:, strip_start:strip_end, block_col_start:block_col_end]
+            counts += strip_counts.sum(axis=(1, 2), dtype=np.int64)
+        # left and right strips by column segments
+        for strip_start, strip_end in [(col_start, inner_col_start), (inner_col_end, col_end)]:
+            strip_counts = self.col_counts[:, block_row_start:block_row_end, strip_start:strip_end]
+            counts += strip_counts.sum(axis=(1, 2), dtype=np.int64)
+        # four corners by pixels
+        for corner_row_start, corner_row_end in [(row_start, inner_row_start), (inner_row_end, row_end)]:
+            for corner_col_start, corner_col_end in [(col_start, inner_col_start), (inner_col_end, col_end)]:
+                counts += self.count_pixels(corner_row_start, corner_row_end, corner_col_start, corner_col_end)
+        return counts
+
+    def count_batch(self, row_starts: np.ndarray, row_ends: np.ndarray, col_starts: np.ndarray, col_ends: np.ndarray):
+        """Count of labelled and unsure pixels of many windows at once.
+
+        Windows with edges on block borders are summed by an integral image of block counts, other windows
+        are counted one by one. Return two arrays of labelled count and unsure count.
+        """
+        size = self.block_size
+        row_starts, row_ends = np.clip(row_starts, 0, self.height), np.clip(row_ends, 0, self.height)
+        col_starts, col_ends = np.clip(col_starts, 0, self.width), np.clip(col_ends, 0, self.width)
+        counts = np.zeros(shape=(2, len(row_starts)), dtype=np.int64)
+
+        # image edge is a block border too, as last blocks are padded by zeros
+        is_aligned = np.ones(len(row_starts), dtype=bool)
+        for lines, length in [(row_starts, self.height), (row_ends, self.height),
+                              (col_starts, self.width), (col_ends, self.width)]:
+            is_aligned &= (lines % size == 0) | (lines == length)
+        block_lines = [-(-lines[is_aligned] // size) for lines in [row_starts, row_ends, col_starts, col_ends]]
+        for i in range(2):
+            counts[i, is_aligned] = IntegralImage(self.block_counts[i]).sums(*block_lines)
+
+        for j in np.flatnonzero(~is_aligned):
+            counts[:, j] = self.count(WindowArg(row_starts[j], row_ends[j], col_starts[j], col_ends[j]))
+        return counts[0], counts[1]
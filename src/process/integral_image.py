@@ -0,0 +1,65 @@
+import numpy as np
+
+from process.util import WindowArg
+
+
+class IntegralImage:
+    """Summed-area table of a 2d array, the sum of any window is got in constant time."""
+
+    def __init__(self, data: np.ndarray):
+        height, width = data.shape
+        total = int(data.sum(dtype=np.uint64))
+        dtype = np.uint32 if total < 2 ** 32 else np.uint64
+        self.table = np.zeros(shape=(height + 1, width + 1), dtype=dtype)
+        np.cumsum(data, axis=0, dtype=dtype, out=self.table[1:, 1:])
+        np.cumsum(self.table[1:, 1:], axis=1, dtype=dtype, out=self.table[1:, 1:])
+
+    def sums(self, row_starts, row_ends, col_starts, col_ends):
+        """Sums of windows [row_start, row_end) x [col_start, col_end), arguments are ints or int arrays."""
+        table = self.table
+        return (table[row_ends, col_ends].astype(np.int64) - table[row_starts, col_ends].astype(np.int64)
+                - table[row_ends, col_starts].astype(np.int64) + table[row_starts, col_starts].astype(np.int64))
+
+
+class NodataIndex:
+    """Nodata percentage of any window in constant time, built once per scene from nodata masks.
+
+    Each layer is the nodata band count of every pixel in a grid factor times coarser than the windows,
+    its pixels are weighted by their overlap with the window, same as counting in the nearest up-sampled window.
+    """
+
+    def __init__(self, band_count: int):
+        self.band_count = band_count
+        self.layers = []
+
+    def add_layer(self, nodata_count: np.ndarray, factor: int = 1):
+        self.layers.append((IntegralImage(nodata_count), factor))
+
+    @staticmethod
+    def get_line_parts(starts: np.ndarray, ends: np.ndarray, factor: int):
+        # weight of coarse line i in [low_start, low_end) is factor, minus the cut off part of first and last line
+        low_starts = starts // factor
+        low_ends = -(-ends // factor)
+        head_cuts = starts - low_starts * factor
+        tail_cuts = low_ends * factor - ends
+        return ((low_starts, low_ends, factor),
+                (low_starts, low_starts + 1, -head_cuts),
+                (low_ends - 1, low_ends, -tail_cuts))
+
+    def get_nodata_counts(self, row_starts, row_ends, col_starts, col_ends):
+        row_starts, row_ends = np.asarray(row_starts), np.asarray(row_ends)
+        col_starts, col_ends = np.asarray(col_starts), np.asarray(col_ends)
+        counts = np.zeros(np.broadcast(row_starts, col_starts).shape, dtype=np.int64)
+        for integral_image, factor in self.layers:
+            for row_start, row_end, row_weight in self.get_line_parts(row_starts, row_ends, factor):
+                for col_start, col_end, col_weight in self.get_line_parts(col_starts, col_ends, factor):
+                    counts += row_weight * col_weight * integral_image.sums(row_start, row_end, col_start, col_end)
+        return counts
+
+    def get_nodata_percentages(self, row_starts, row_ends, col_starts, col_ends):
+        sizes = (np.asarray(row_ends) - row_starts) * (np.asarray(col_ends) - col_starts) * self.band_count
+        return self.get_nodata_counts(row_starts, row_ends, col_starts, col_ends) / sizes
+
+    def get_nodata_percentage(self, window_arg: WindowArg):
+        return float(self.get_nodata_percentages(window_arg.row_start, window_arg.row_end,
+                                                 window_arg.col_start, window_arg.col_end))
@@ -1,3 +1,7 @@
 from .stack_reader import StackReader
 from .unstack_reader import UnstackReader
 from .lucc_reader import LuccReader
+from .lazy_stack_reader import LazyStackReader
+from .remote_stack_reader import RemoteStackReader
+from .band_cache import DecodedBandCache
+from .class_remapper import ClassRemapper
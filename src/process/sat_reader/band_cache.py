@@ -0,0 +1,131 @@
+import collections
+import glob
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+import rasterio
+from affine import Affine
+from rasterio.crs import CRS
+
+
+class DecodedBandCache:
+    """Decode each band once into an uncompressed memory-mapped array on local disk.
+
+    An entry is keyed by the absolute source path and is decoded again when the mtime or size of the source changes.
+    When the total size exceeds max_size bytes, the least recently used entries are evicted.
+    """
+
+    def __init__(self, cache_folder: str, max_size: int):
+        self.cache_folder = cache_folder
+        self.max_size = max_size
+        os.makedirs(cache_folder, exist_ok=True)
+        # entries being read by threads of this process are not evicted
+        self.lock = threading.Lock()
+        self.reading_paths = collections.Counter()
+
+    def get_paths(self, input_path: str):
+        key = hashlib.sha1(os.path.abspath(input_path).encode()).hexdigest()
+        return os.path.join(self.cache_folder, f"{key}.npy"), os.path.join(self.cache_folder, f"{key}.json")
+
+    @staticmethod
+    def dump_profile(profile: dict):
+        profile = dict(profile)
+        profile["crs"] = profile["crs"].to_wkt() if profile.get("crs") is not None else None
+        profile["transform"] = list(profile["transform"])[:6]
+        return profile
+
+    @staticmethod
+    def load_profile(profile: dict):
+        profile = dict(profile)
+        profile["crs"] = CRS.from_wkt(profile["crs"]) if profile["crs"] is not None else None
+        profile["transform"] = Affine(*profile["transform"])
+        return profile
+
+    def read(self, input_path: str):
+        """Read data and profile of input_path, data is a read-only np.memmap in shape (c h w)."""
+        data_path, meta_path = self.get_paths(input_path)
+        with self.lock:
+            self.reading_paths[data_path] += 1
+        try:
+            return self.read_entry(input_path, data_path, meta_path)
+        finally:
+            with self.lock:
+                self.reading_paths[data_path] -= 1
+                if self.reading_paths[data_path] == 0:
+                    del self.reading_paths[data_path]
+
+    def read_entry(self, input_path: str, data_path: str, meta_path: str):
+        stat = os.stat(input_path)
+        try:
+            with open(meta_path, "r") as file:
+                meta = json.load(file)
+            if meta["mtime"] == stat.st_mtime_ns and meta["size"] == stat.st_size:
+                # mark as recently used
+                os.utime(meta_path)
+                return np.load(data_path, mmap_mode="r"), self.load_profile(meta["profile"])
+        except FileNotFoundError:
+            # not cached, or evicted by another process meanwhile
+            pass
+
+        # decode once more if another process evicts the new entry before it is opened
+        for retry in range(2):
+            try:
+                profile = self.decode(input_path, data_path, meta_path, stat)
+                data = np.load(data_path, mmap_mode="r")
+                break
+            except FileNotFoundError:
+                if retry == 1:
+                    raise
+        # memmap is opened before evict, an opened entry stays readable after its files are removed
+        self.evict(keep_path=data_path)
+        return data, profile
+
+    def decode(self, input_path: str, data_path: str, meta_path: str, stat: os.stat_result):
+        # write to temp files first, the cache may be shared by other processes and threads
+        temp_suffix = f"{os.getpid()}.{threading.get_ident()}.tmp"
+        temp_data_path = f"{data_path}.{temp_suffix}.npy"
+        temp_meta_path = f"{meta_path}.{temp_suffix}"
+        with rasterio.open(input_path) as src:
+            data = np.lib.format.open_memmap(temp_data_path, mode="w+", dtype=src.dtypes[0],
+                                             shape=(src.count, src.height, src.width))
+            src.read(out=data)
+            data.flush()
+            del data
+            profile = src.profile
+
+        meta = {"mtime": stat.st_mtime_ns, "size": stat.st_size, "profile": self.dump_profile(profile)}
+        with open(temp_meta_path, "w") as file:
+            json.dump(meta, file)
+        os.replace(temp_data_path, data_path)
+        os.replace(temp_meta_path, meta_path)
+        return profile
+
+    def evict(self, keep_path: str = None):
+        entries = []
+        for data_path in glob.glob(os.path.join(self.cache_folder, "*.npy")):
+            if data_path.endswith(".tmp.npy"):
+                continue
+            meta_path = os.path.splitext(data_path)[0] + ".json"
+            try:
+                entries.append((os.path.getmtime(meta_path), os.path.getsize(data_path), data_path, meta_path))
+            except FileNotFoundError:
+                continue
+
+        total_size = sum(entry[1] for entry in entries)
+        # least recently used first
+        for _, size, data_path, meta_path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            with self.lock:
+                is_reading = data_path in self.reading_paths
+            if data_path == keep_path or is_reading:
+                continue
+            for path in [meta_path, data_path]:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            total_size -= size
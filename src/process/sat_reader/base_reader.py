@@ -8,5 +8,11 @@ class SatBaseReader:
     def read_window_transform(self, *args):
         raise NotImplementedError
 
+    def get_nodata_index(self):
+        raise NotImplementedError
+
     def crop_data(self, window_arg: WindowArg, output_path: str):
         raise NotImplementedError
+
+    def close(self):
+        pass
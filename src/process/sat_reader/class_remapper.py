@@ -0,0 +1,53 @@
+import json
+
+import numpy as np
+
+
+class ClassRemapper:
+    """Remap class values of a land cover product with a lookup table in one vectorized pass.
+
+    Values not in mapping are kept, or set to default_value if it is given.
+    Remapped data is in the smallest dtype that holds every value of the lookup table.
+    """
+
+    def __init__(self, mapping: dict[int, int], default_value: int = None):
+        self.mapping = {int(old_value): int(new_value) for old_value, new_value in mapping.items()}
+        self.default_value = default_value
+        self.luts = {}
+
+    @classmethod
+    def from_json(cls, json_path: str):
+        """Read mapping table such as {"mapping": {"10": 1, "20": 2}, "default_value": 0}"""
+        with open(json_path, "r") as file:
+            config = json.load(file)
+        return cls(config["mapping"], config.get("default_value"))
+
+    def get_lut(self, src_dtype: np.dtype):
+        src_dtype = np.dtype(src_dtype)
+        if src_dtype.kind not in "ui" or src_dtype.itemsize > 2:
+            raise ValueError(f"Lookup table remap supports 8 bit and 16 bit integer data, not {src_dtype}.")
+        if src_dtype in self.luts:
+            return self.luts[src_dtype]
+
+        # data is viewed as unsigned index of the lookup table, which also works for signed data
+        index_dtype = np.dtype(f"uint{src_dtype.itemsize * 8}")
+        src_values = np.arange(np.iinfo(index_dtype).max + 1, dtype=index_dtype).view(src_dtype)
+        if self.default_value is None:
+            lut = src_values.astype(np.int64)
+        else:
+            lut = np.full(src_values.shape, self.default_value, dtype=np.int64)
+        for old_value, new_value in self.mapping.items():
+            if np.iinfo(src_dtype).min <= old_value <= np.iinfo(src_dtype).max:
+                lut[np.array(old_value, dtype=src_dtype).view(index_dtype)] = new_value
+
+        dst_dtype = np.result_type(np.min_scalar_type(lut.min()), np.min_scalar_type(lut.max()))
+        self.luts[src_dtype] = (lut.astype(dst_dtype), index_dtype)
+        return self.luts[src_dtype]
+
+    def get_dst_dtype(self, src_dtype: np.dtype):
+        lut, _ = self.get_lut(src_dtype)
+        return lut.dtype
+
+    def remap(self, data: np.ndarray):
+        lut, index_dtype = self.get_lut(data.dtype)
+        return np.take(lut, data.view(index_dtype))
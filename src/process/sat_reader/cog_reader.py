@@ -0,0 +1,72 @@
+import hashlib
+import os
+
+import numpy as np
+import rasterio
+
+from process.util import WindowArg
+
+
+class CogBlockReader:
+    """Read windows of a remote Cloud-Optimized GeoTIFF block by block.
+
+    GDAL fetches every internal block with one HTTP range request, and fetched blocks are saved in
+    cache_folder, so windows that share blocks or later runs over the same scene do not fetch them again.
+    """
+    gdal_env = {"GDAL_DISABLE_READDIR_ON_OPEN": "EMPTY_DIR", "GDAL_HTTP_MULTIRANGE": "YES",
+                "GDAL_HTTP_MERGE_CONSECUTIVE_RANGES": "YES"}
+
+    def __init__(self, href: str, cache_folder: str):
+        self.href = href
+        self.cache_folder = os.path.join(cache_folder, hashlib.sha1(href.encode()).hexdigest())
+        os.makedirs(self.cache_folder, exist_ok=True)
+
+        with rasterio.Env(**self.gdal_env):
+            self.src = rasterio.open(href)
+        self.profile = self.src.profile
+        self.res = self.src.res
+        self.count = self.src.count
+        self.dtype = self.src.dtypes[0]
+        self.height, self.width = self.src.shape
+        self.block_height, self.block_width = self.src.block_shapes[0]
+
+    def read_block(self, block_row: int, block_col: int):
+        block_path = os.path.join(self.cache_folder, f"{block_row}_{block_col}.npy")
+        if os.path.exists(block_path):
+            return np.load(block_path)
+
+        window = self.src.block_window(1, block_row, block_col)
+        with rasterio.Env(**self.gdal_env):
+            data = self.src.read(window=window)
+
+        # write to temp file first, the cache may be shared by other processes
+        temp_path = f"{block_path}.{os.getpid()}.tmp.npy"
+        np.save(temp_path, data)
+        os.replace(temp_path, block_path)
+        return data
+
+    def read(self, window_arg: WindowArg):
+        height = window_arg.row_end - window_arg.row_start
+        width = window_arg.col_end - window_arg.col_start
+        data = np.zeros(shape=(self.count, height, width), dtype=self.dtype)
+
+        for block_row in range(window_arg.row_start // self.block_height,
+                               (window_arg.row_end - 1) // self.block_height + 1):
+            for block_col in range(window_arg.col_start // self.block_width,
+                                   (window_arg.col_end - 1) // self.block_width + 1):
+                block_data = self.read_block(block_row, block_col)
+                block_row_start = block_row * self.block_height
+                block_col_start = block_col * self.block_width
+                # intersection of block and window in image coordinates
+                row_start = max(window_arg.row_start, block_row_start)
+                row_end = min(window_arg.row_end, block_row_start + block_data.shape[1])
+                col_start = max(window_arg.col_start, block_col_start)
+                col_end = min(window_arg.col_end, block_col_start + block_data.shape[2])
+                data[:, row_start - window_arg.row_start:row_end - window_arg.row_start,
+                     col_start - window_arg.col_start:col_end - window_arg.col_start] = \
+                    block_data[:, row_start - block_row_start:row_end - block_row_start,
+                               col_start - block_col_start:col_end - block_col_start]
+        return data
+
+    def close(self):
+        self.src.close()
@@ -0,0 +1,101 @@
+import copy
+import os
+
+import numpy as np
+import rasterio
+from rasterio.windows import Window
+
+from process.integral_image import NodataIndex
+from process.util import WindowArg
+from process.writer import BaseWriter, GeoTiffWriter
+from .base_reader import SatBaseReader
+from .util import get_up_sample_profile, get_window_arg_in_low_resolution, up_sample_window_data
+
+
+class LazyStackReader(SatBaseReader):
+    """Stack reader that keeps band datasets open and reads one window per crop.
+
+    Peak memory scales with the window size instead of the scene size, and the output is the same as StackReader.
+    """
+
+    def __init__(self, folder_path: str, band_filenames: list[str], dst_resolution: int, writer: BaseWriter = None):
+        self.folder_path = folder_path
+        self.band_filenames = band_filenames
+        self.dst_resolution = dst_resolution
+        self.writer = writer if writer is not None else GeoTiffWriter()
+        self.srcs = self.open_bands()
+        self.factors = [int(max(src.res) / dst_resolution) for src in self.srcs]
+        # profile in dst resolution
+        self.profile = self.read_profile()
+        self.nodata_index = None
+
+    def open_bands(self):
+        return [rasterio.open(os.path.join(self.folder_path, band_filename)) for band_filename in self.band_filenames]
+
+    def read_profile(self):
+        return get_up_sample_profile(self.srcs[0].profile, self.factors[0])
+
+    def window_transform(self, window: Window):
+        return rasterio.windows.transform(window, self.profile["transform"])
+
+    def read_band_window(self, src, window_arg: WindowArg):
+        window = Window.from_slices(slice(window_arg.row_start, window_arg.row_end),
+                                    slice(window_arg.col_start, window_arg.col_end))
+        return src.read(window=window)
+
+    def get_nodata_index(self):
+        """Build the nodata index once by reading bands one by one, so only one whole band is in memory."""
+        if self.nodata_index is None:
+            self.nodata_index = NodataIndex(band_count=len(self.srcs))
+            for src, factor in zip(self.srcs, self.factors):
+                window_arg = WindowArg(row_start=0, row_end=src.height, col_start=0, col_end=src.width)
+                data = self.read_band_window(src, window_arg)
+                self.nodata_index.add_layer(np.count_nonzero(data == 0, axis=0).astype(np.uint8), factor)
+        return self.nodata_index
+
+    def read_window_data(self, window_arg: WindowArg):
+        height = window_arg.row_end - window_arg.row_start
+        width = window_arg.col_end - window_arg.col_start
+        dst_data = np.empty(shape=(len(self.srcs), height, width), dtype=self.profile["dtype"])
+        for i, (src, factor) in enumerate(zip(self.srcs, self.factors)):
+            low_window_arg = get_window_arg_in_low_resolution(window_arg, factor)
+            low_data = self.read_band_window(src, low_window_arg)
+            dst_data[i] = up_sample_window_data(low_data, window_arg, factor)[0]
+        return dst_data
+
+    def read_crop(self, window_arg: WindowArg):
+        profile = copy.copy(self.profile)
+        height = window_arg.row_end - window_arg.row_start
+        width = window_arg.col_end - window_arg.col_start
+        window = Window.from_slices(slice(window_arg.row_start, window_arg.row_end),
+                                    slice(window_arg.col_start, window_arg.col_end))
+        dst_transform = self.window_transform(window)
+
+        profile.update(count=len(self.srcs),
+                       height=height,
+                       width=width,
+                       transform=dst_transform)
+        dst_data = self.read_window_data(window_arg)
+        return dst_data, profile
+
+    def crop_data(self, window_arg: WindowArg, output_path: str, drop_nodata_percentage: float = None):
+        """Write window as a sample, return False if window is dropped by nodata."""
+        # remove nodata crop before reading when the nodata index is already built
+        if drop_nodata_percentage is not None and self.nodata_index is not None:
+            if self.nodata_index.get_nodata_percentage(window_arg) >= drop_nodata_percentage:
+                return False
+
+        dst_data, profile = self.read_crop(window_arg)
+
+        # remove nodata crop
+        if drop_nodata_percentage is not None and self.nodata_index is None:
+            nodata_percentage = np.count_nonzero(dst_data == 0) / dst_data.size
+            if nodata_percentage >= drop_nodata_percentage:
+                return False
+
+        self.writer.write(output_path, dst_data, profile, window_arg)
+        return True
+
+    def close(self):
+        for src in self.srcs:
+            src.close()
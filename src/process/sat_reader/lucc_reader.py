@@ -1,4 +1,5 @@
 import copy
+import functools
 import json
 import os
 import shutil
@@ -8,41 +9,46 @@ import rasterio
 from rasterio.windows import Window
 
 from process.util import WindowArg
+from process.writer import BaseWriter, GeoTiffWriter
 from .base_reader import SatBaseReader
-from .util import read_data_with_up_sample
+from .class_remapper import ClassRemapper
+from .util import (read_data, get_resolution, get_up_sample_profile, get_window_arg_in_low_resolution,
+                   up_sample_window_data)
 
 
 class LuccReader(SatBaseReader):
     lucc_filename = "lulc.tif"
     lucc_values = [0, 10, 20, 30, 40, 50, 60, 70, 80, 90, 95, 100]
-    def __init__(self, folder_path: str, dst_resolution: int):
+
+    def __init__(self, folder_path: str, dst_resolution: int, lucc_filename: str = None,
+                 class_remapper: ClassRemapper = None, writer: BaseWriter = None):
 
         self.folder_path = folder_path
         self.dst_resolution = dst_resolution
-        # read data and profile
-        self.data, self.profile = self.read_data_and_profile()
+        self.writer = writer if writer is not None else GeoTiffWriter()
+        if lucc_filename is not None:
+            self.lucc_filename = lucc_filename
+        if class_remapper is None:
+            mapping = {old_value: new_value for new_value, old_value in enumerate(self.lucc_values)}
+            class_remapper = ClassRemapper(mapping)
+        self.class_remapper = class_remapper
+        # data is kept in native resolution, and only cropped window is remapped and up sampled to dst resolution
+        self.data, self.factor, self.profile = self.read_data_and_profile()
         # use window_transform to update transform of sample
         self.window_transform = self.read_window_transform()
 
     def read_data_and_profile(self):
         input_path = os.path.join(self.folder_path, self.lucc_filename)
-        data, profile = read_data_with_up_sample(input_path, self.dst_resolution)
-
-        for new_value, old_value in enumerate(self.lucc_values):
-            data[data == old_value] = new_value
-
-        return data, profile
+        data, profile = read_data(input_path)
+        factor = int(get_resolution(profile) / self.dst_resolution)
+        profile = get_up_sample_profile(profile, factor)
+        profile.update(dtype=self.class_remapper.get_dst_dtype(data.dtype))
+        return data, factor, profile
 
     def read_window_transform(self):
-        input_path = os.path.join(self.folder_path, self.lucc_filename)
-        with rasterio.open(input_path) as src:
-            if max(src.res) == self.dst_resolution:
-                return src.window_transform
-        return 1
-
-    def crop_data(self, window_arg: WindowArg, output_path: str):
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        return functools.partial(rasterio.windows.transform, transform=self.profile["transform"])
 
+    def read_crop(self, window_arg: WindowArg):
         profile = copy.copy(self.profile)
         height = window_arg.row_end - window_arg.row_start
         width = window_arg.col_end - window_arg.col_start
@@ -54,8 +60,13 @@ class LuccReader(SatBaseReader):
                        height=height,
                        width=width,
                        transform=dst_transform)
-        dst_data = self.data[:, window_arg.row_start:window_arg.row_end, window_arg.col_start:window_arg.col_end]
+        low_window_arg = get_window_arg_in_low_resolution(window_arg, self.factor)
+        low_data = self.data[:, low_window_arg.row_start:low_window_arg.row_end,
+                             low_window_arg.col_start:low_window_arg.col_end]
+        dst_data = up_sample_window_data(self.class_remapper.remap(low_data), window_arg, self.factor)
+        return dst_data, profile
 
-        with rasterio.open(output_path, "w", **profile) as dst:
-            dst.write(dst_data)
+    def crop_data(self, window_arg: WindowArg, output_path: str):
+        dst_data, profile = self.read_crop(window_arg)
+        self.writer.write(output_path, dst_data, profile, window_arg)
 
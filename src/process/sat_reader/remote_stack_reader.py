@@ -0,0 +1,23 @@
+import os
+
+from process.util import WindowArg
+from process.writer import BaseWriter
+from .cog_reader import CogBlockReader
+from .lazy_stack_reader import LazyStackReader
+
+
+class RemoteStackReader(LazyStackReader):
+    """Stack reader that reads only the cropped windows from remote band hrefs, without downloading bands."""
+
+    def __init__(self, hrefs: list[str], dst_resolution: int, cache_folder: str, writer: BaseWriter = None):
+        self.hrefs = hrefs
+        self.cache_folder = cache_folder
+        band_filenames = [os.path.basename(href) for href in hrefs]
+        super().__init__(folder_path=None, band_filenames=band_filenames, dst_resolution=dst_resolution,
+                         writer=writer)
+
+    def open_bands(self):
+        return [CogBlockReader(href, self.cache_folder) for href in self.hrefs]
+
+    def read_band_window(self, src: CogBlockReader, window_arg: WindowArg):
+        return src.read(window_arg)
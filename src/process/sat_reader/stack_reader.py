@@ -1,58 +1,119 @@
 import copy
+import functools
 import json
 import os
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
 import rasterio
-from einops import rearrange
 from rasterio.windows import Window
 
+from process.integral_image import NodataIndex
 from process.util import WindowArg
+from process.writer import BaseWriter, GeoTiffWriter
 from .base_reader import SatBaseReader
-from .util import read_data_with_up_sample
+from .band_cache import DecodedBandCache
+from .util import (get_resolution, get_up_sample_profile, get_window_arg_in_low_resolution,
+                   up_sample_window_data)
 
 
 class StackReader(SatBaseReader):
-    def __init__(self, folder_path: str, band_filenames: list[str], dst_resolution: int):
+    def __init__(self, folder_path: str, band_filenames: list[str], dst_resolution: int,
+                 band_cache: DecodedBandCache = None, max_workers: int = 4, writer: BaseWriter = None):
         self.folder_path = folder_path
         self.band_filenames = band_filenames
         self.dst_resolution = dst_resolution
-        # read data and profile
-        self.data, self.profile = self.read_data_and_profile()
+        self.band_cache = band_cache
+        self.max_workers = max_workers
+        self.writer = writer if writer is not None else GeoTiffWriter()
+        # bands are kept in native resolution, and only cropped window is up sampled to dst resolution
+        self.datas, self.factors, self.profile = self.read_data_and_profile()
         # use window_transform to update transform of sample
         self.window_transform = self.read_window_transform()
+        self.nodata_index = None
+
+    @staticmethod
+    def decode_band(input_path: str, out: np.ndarray):
+        with rasterio.open(input_path) as src:
+            src.read(out=out)
+
+    def decode_bands(self, input_paths: list[str]):
+        profiles = []
+        for input_path in input_paths:
+            with rasterio.open(input_path) as src:
+                profiles.append(src.profile)
+
+        # 1. allocate one (c h w) buffer for bands in the same native shape, each band is a view of it
+        buffers = {}
+        group_counts = {}
+        for profile in profiles:
+            key = (profile["height"], profile["width"], profile["dtype"])
+            group_counts[key] = group_counts.get(key, 0) + profile["count"]
+        for (height, width, dtype), count in group_counts.items():
+            buffers[(height, width, dtype)] = np.empty(shape=(count, height, width), dtype=dtype)
+
+        datas = []
+        group_offsets = {key: 0 for key in buffers.keys()}
+        for profile in profiles:
+            key = (profile["height"], profile["width"], profile["dtype"])
+            offset = group_offsets[key]
+            datas.append(buffers[key][offset:offset + profile["count"]])
+            group_offsets[key] = offset + profile["count"]
+
+        # 2. decode bands into their views in parallel, gdal releases GIL while decompressing
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            list(executor.map(self.decode_band, input_paths, datas))
+        return datas, profiles
 
     def read_data_and_profile(self):
-        data = None
-        profile = None
-        for band_filename in self.band_filenames:
-            input_path = os.path.join(self.folder_path, band_filename)
-            temp_data, temp_profile = read_data_with_up_sample(input_path, self.dst_resolution)
-            if data is None and profile is None:
-                data = [temp_data]
-                profile = temp_profile
-            else:
-                data.append(temp_data)
-        data = rearrange(data, "c 1 h w -> c h w")
-        return data, profile
+        input_paths = [os.path.join(self.folder_path, band_filename) for band_filename in self.band_filenames]
+        if self.band_cache is not None:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                datas, band_profiles = zip(*executor.map(self.band_cache.read, input_paths))
+            datas = list(datas)
+        else:
+            datas, band_profiles = self.decode_bands(input_paths)
+
+        factors = [int(get_resolution(band_profile) / self.dst_resolution) for band_profile in band_profiles]
+        # profile in dst resolution
+        profile = get_up_sample_profile(band_profiles[0], factors[0])
+        return datas, factors, profile
 
     def save(self, output_path: str):
-        _, h, w = self.data.shape()
-        window_arg = WindowArg(row_start=0, row_end=h, col_start=0, col_end=w)
+        window_arg = WindowArg(row_start=0, row_end=self.profile["height"], col_start=0, col_end=self.profile["width"])
         self.crop_data(window_arg, output_path)
 
     def read_window_transform(self):
-        for band_filename in self.band_filenames:
-            input_path = os.path.join(self.folder_path, band_filename)
-            with rasterio.open(input_path) as src:
-                if max(src.res) == self.dst_resolution:
-                    return src.window_transform
-        return 1
+        return functools.partial(rasterio.windows.transform, transform=self.profile["transform"])
 
-    def crop_data(self, window_arg: WindowArg, output_path: str, drop_nodata_percentage: float = None):
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    def get_nodata_index(self):
+        """Build the nodata index once, bands in the same native resolution share one layer."""
+        if self.nodata_index is None:
+            nodata_counts = {}
+            for data, factor in zip(self.datas, self.factors):
+                nodata_count = np.count_nonzero(data == 0, axis=0).astype(np.uint8)
+                if factor in nodata_counts:
+                    nodata_counts[factor] += nodata_count
+                else:
+                    nodata_counts[factor] = nodata_count
+            self.nodata_index = NodataIndex(band_count=len(self.datas))
+            for factor, nodata_count in nodata_counts.items():
+                self.nodata_index.add_layer(nodata_count, factor)
+        return self.nodata_index
+
+    def read_window_data(self, window_arg: WindowArg):
+        height = window_arg.row_end - window_arg.row_start
+        width = window_arg.col_end - window_arg.col_start
+        dst_data = np.empty(shape=(len(self.datas), height, width), dtype=self.profile["dtype"])
+        for i, (data, factor) in enumerate(zip(self.datas, self.factors)):
+            low_window_arg = get_window_arg_in_low_resolution(window_arg, factor)
+            low_data = data[:, low_window_arg.row_start:low_window_arg.row_end,
+                            low_window_arg.col_start:low_window_arg.col_end]
+            dst_data[i] = up_sample_window_data(low_data, window_arg, factor)[0]
+        return dst_data
 
+    def read_crop(self, window_arg: WindowArg):
         profile = copy.copy(self.profile)
         height = window_arg.row_end - window_arg.row_start
         width = window_arg.col_end - window_arg.col_start
@@ -64,16 +125,19 @@ class StackReader(SatBaseReader):
                        height=height,
                        width=width,
                        transform=dst_transform)
-        dst_data = self.data[:, window_arg.row_start:window_arg.row_end, window_arg.col_start:window_arg.col_end]
+        dst_data = self.read_window_data(window_arg)
+        return dst_data, profile
 
-        # remove nodata crop
+    def crop_data(self, window_arg: WindowArg, output_path: str, drop_nodata_percentage: float = None):
+        """Write window as a sample, return False if window is dropped by nodata."""
+        # remove nodata crop before slicing any band
         if drop_nodata_percentage is not None:
-            nodata_percentage = np.count_nonzero(dst_data == 0) / dst_data.size
-            if nodata_percentage >= drop_nodata_percentage:
-                return
+            if self.get_nodata_index().get_nodata_percentage(window_arg) >= drop_nodata_percentage:
+                return False
 
-        with rasterio.open(output_path, "w", **profile) as dst:
-            dst.write(dst_data)
+        dst_data, profile = self.read_crop(window_arg)
+        self.writer.write(output_path, dst_data, profile, window_arg)
+        return True
 
     def read_metadata(self, output_folder: str):
         metadata = {"bands": []}
@@ -1,22 +1,31 @@
 import copy
+import functools
 import os
 
 import numpy as np
 import rasterio
 from rasterio.windows import Window
 
+from process.integral_image import NodataIndex
 from process.util import WindowArg
+from process.writer import BaseWriter, GeoTiffWriter
+from .band_cache import DecodedBandCache
 from .base_reader import SatBaseReader
 
 
 class UnstackReader(SatBaseReader):
 
-    def __init__(self, folder_path: str, band_filenames: list[str]):
+    def __init__(self, folder_path: str, band_filenames: list[str], band_cache: DecodedBandCache = None,
+                 writer: BaseWriter = None):
         self.folder_path = folder_path
         self.band_filenames = band_filenames
+        self.band_cache = band_cache
+        self.writer = writer if writer is not None else GeoTiffWriter()
         self.datas, self.profiles, self.window_transforms, self.resolutions \
             = self.read_data_and_profile_and_window_transform()
         self.min_resolution = min(self.resolutions)
+        self.coarsest_band_index = int(np.argmax(self.resolutions))
+        self.nodata_index = None
 
     def read_data_and_profile_and_window_transform(self):
         datas = []
@@ -25,6 +34,15 @@ class UnstackReader(SatBaseReader):
         resolutions = []
         for filename in self.band_filenames:
             input_path = os.path.join(self.folder_path, filename)
+            if self.band_cache is not None:
+                # slice zero copy views from cached band
+                data, profile = self.band_cache.read(input_path)
+                transform = profile["transform"]
+                datas.append(data)
+                profiles.append(profile)
+                window_transforms.append(functools.partial(rasterio.windows.transform, transform=transform))
+                resolutions.append(min(abs(transform.a), abs(transform.e)))
+                continue
             with rasterio.open(input_path) as src:
                 datas.append(src.read())
                 profiles.append(src.profile)
@@ -42,30 +60,44 @@ class UnstackReader(SatBaseReader):
 
         return WindowArg(row_start, row_end, col_start, col_end)
 
-    def crop_data(self, window_arg_in_min_resolution: WindowArg, output_path: str):
-        output_folder = os.path.splitext(output_path)[0]
-        os.makedirs(output_folder, exist_ok=True)
+    def read_band_crop(self, i: int, window_arg_in_min_resolution: WindowArg):
+        factor = self.resolutions[i] / self.min_resolution
+        window_arg = self.get_window_arg_in_factor(window_arg_in_min_resolution, factor)
+        window = Window.from_slices(slice(window_arg.row_start, window_arg.row_end),
+                                    slice(window_arg.col_start, window_arg.col_end))
+        dst_transform = self.window_transforms[i](window)
+        profile = copy.copy(self.profiles[i])
+        height = window_arg.row_end - window_arg.row_start
+        width = window_arg.col_end - window_arg.col_start
+        profile.update(height=height,
+                       width=width,
+                       transform=dst_transform)
+        dst_data = self.datas[i][:, window_arg.row_start:window_arg.row_end,
+                   window_arg.col_start:window_arg.col_end]
+        return dst_data, profile
 
-        for i, filename in enumerate(self.band_filenames):
-            band_output_path = os.path.join(output_folder, filename)
-            factor = self.resolutions[i] / self.min_resolution
-            window_arg = self.get_window_arg_in_factor(window_arg_in_min_resolution, factor)
-            window = Window.from_slices(slice(window_arg.row_start, window_arg.row_end),
-                                        slice(window_arg.col_start, window_arg.col_end))
-            dst_transform = self.window_transforms[i](window)
-            profile = copy.copy(self.profiles[i])
-            height = window_arg.row_end - window_arg.row_start
-            width = window_arg.col_end - window_arg.col_start
-            profile.update(height=height,
-                           width=width,
-                           transform=dst_transform)
-            dst_data = self.datas[i][:, window_arg.row_start:window_arg.row_end,
-                       window_arg.col_start:window_arg.col_end]
+    def get_nodata_index(self):
+        """Build the nodata index once from the coarsest band, which has the fewest pixels."""
+        if self.nodata_index is None:
+            coarsest_data = self.datas[self.coarsest_band_index]
+            factor = round(self.resolutions[self.coarsest_band_index] / self.min_resolution)
+            self.nodata_index = NodataIndex(band_count=coarsest_data.shape[0])
+            self.nodata_index.add_layer(np.count_nonzero(coarsest_data == 0, axis=0).astype(np.uint8), factor)
+        return self.nodata_index
 
-            # remove nodata crop
-            nodata_percentage = np.count_nonzero(dst_data == 0) / dst_data.size
-            if nodata_percentage >= 0.5:
-                return
+    def crop_data(self, window_arg_in_min_resolution: WindowArg, output_path: str,
+                  drop_nodata_percentage: float = None):
+        """Write bands of window into a sample folder, return False if window is dropped by nodata."""
+        # 1. remove nodata crop by the nodata index of the coarsest band
+        if drop_nodata_percentage is not None:
+            nodata_percentage = self.get_nodata_index().get_nodata_percentage(window_arg_in_min_resolution)
+            if nodata_percentage >= drop_nodata_percentage:
+                return False
 
-            with rasterio.open(band_output_path, "w", **profile) as dst:
-                dst.write(dst_data)
+        # 2. write bands of one sample together
+        datas, profiles = zip(*[self.read_band_crop(i, window_arg_in_min_resolution)
+                                for i in range(len(self.band_filenames))])
+        output_folder = os.path.splitext(output_path)[0]
+        self.writer.write_folder(output_folder, self.band_filenames, list(datas), list(profiles),
+                                 window_arg_in_min_resolution)
+        return True
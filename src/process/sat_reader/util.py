@@ -1,3 +1,4 @@
+import copy
 import os
 
 import numpy as np
@@ -5,9 +6,32 @@ import rasterio
 from osgeo import gdal, ogr
 from rasterio.enums import Resampling
 
+from process.util import WindowArg
+
 gdal.UseExceptions()
 
 
+def get_up_sample_profile(profile: dict, upscale_factor: int):
+    profile = copy.copy(profile)
+    dst_transform = profile["transform"] * profile["transform"].scale((1 / upscale_factor), (1 / upscale_factor))
+    profile.update(transform=dst_transform,
+                   width=profile["width"] * upscale_factor,
+                   height=profile["height"] * upscale_factor)
+    if "blockxsize" in profile and "blockysize" in profile:
+        profile.update(blockxsize=profile["blockxsize"] * upscale_factor,
+                       blockysize=profile["blockysize"] * upscale_factor)
+    return profile
+
+
+def read_data(input_path: str):
+    with rasterio.open(input_path) as src:
+        return src.read(), src.profile
+
+
+def get_resolution(profile: dict):
+    return max(abs(profile["transform"].a), abs(profile["transform"].e))
+
+
 def read_data_with_up_sample(input_path: str, dst_resolution: int):
     with rasterio.open(input_path) as src:
         src_resolution = max(src.res)
@@ -22,16 +46,33 @@ def read_data_with_up_sample(input_path: str, dst_resolution: int):
                     src.width * upscale_factor
                 ),
                 resampling=Resampling.nearest)
-            dst_transform = src.transform * src.transform.scale((1 / upscale_factor), (1 / upscale_factor))
-            profile = src.profile
-            profile.update(transform=dst_transform,
-                           width=dst_data.shape[1],
-                           height=dst_data.shape[2],
-                           blockxsize=profile["blockxsize"] * upscale_factor,
-                           blockysize=profile["blockysize"] * upscale_factor)
+            profile = get_up_sample_profile(src.profile, upscale_factor)
             return dst_data, profile
 
 
+def get_window_arg_in_low_resolution(window_arg: WindowArg, factor: int):
+    """Get the smallest window in low resolution that covers window_arg in high resolution."""
+    return WindowArg(row_start=window_arg.row_start // factor,
+                     row_end=-(-window_arg.row_end // factor),
+                     col_start=window_arg.col_start // factor,
+                     col_end=-(-window_arg.col_end // factor))
+
+
+def up_sample_window_data(low_data: np.ndarray, window_arg: WindowArg, factor: int):
+    """Nearest up sample of data read by get_window_arg_in_low_resolution(window_arg, factor).
+
+    The result is the same as cropping window_arg from the whole band up sampled with Resampling.nearest.
+    """
+    if factor == 1:
+        return low_data
+    data = low_data.repeat(factor, axis=-2).repeat(factor, axis=-1)
+    row_offset = window_arg.row_start % factor
+    col_offset = window_arg.col_start % factor
+    height = window_arg.row_end - window_arg.row_start
+    width = window_arg.col_end - window_arg.col_start
+    return data[..., row_offset:row_offset + height, col_offset:col_offset + width]
+
+
 def up_sample_and_save_as_tif(input_path: str, output_path: str, dst_resolution: int):
     data, profile = read_data_with_up_sample(input_path, dst_resolution)
 
@@ -39,6 +80,25 @@ def up_sample_and_save_as_tif(input_path: str, output_path: str, dst_resolution:
         dst.write(data)
 
 
+def read_decimated(input_path: str, height: int, width: int):
+    """Read band in shape (c height width), gdal reads from internal overviews if the file has them."""
+    with rasterio.open(input_path) as src:
+        return src.read(out_shape=(src.count, height, width), resampling=Resampling.average)
+
+
+def percentile_stretch(data: np.ndarray, low_percentile: float = 2, high_percentile: float = 98):
+    """Stretch every band between its percentiles of valid pixels to uint8, nodata 0 is kept 0."""
+    dst_data = np.zeros(data.shape, dtype=np.uint8)
+    for i, band in enumerate(data):
+        valid = band != 0
+        if not np.any(valid):
+            continue
+        low, high = np.percentile(band[valid], [low_percentile, high_percentile])
+        stretched = (band.astype(np.float32) - low) / max(high - low, 1e-6) * 254 + 1
+        dst_data[i] = np.where(valid, np.clip(stretched, 1, 255), 0)
+    return dst_data
+
+
 def up_sample_and_sqrt_and_save_as_jpeg(input_path: str, output_path: str, dst_resolution: int):
     data, profile = read_data_with_up_sample(input_path, dst_resolution)
 
@@ -1,5 +1,6 @@
 import dataclasses
 
+import shapely
 from osgeo import ogr
 from rasterio.transform import AffineTransformer
 
@@ -20,15 +21,30 @@ class WindowArg:
     def __str__(self):
         return f"{self.row_start}_{self.row_end}_{self.col_start}_{self.col_end}"
 
-def window2geom(affine_transformer: AffineTransformer, window_arg: WindowArg):
-    min_x, min_y = affine_transformer.xy(window_arg.row_end, window_arg.col_start)
-    max_x, max_y = affine_transformer.xy(window_arg.row_start, window_arg.col_end)
+
+def ogr2shapely(geometry_list: list[ogr.Geometry]):
+    """Convert ogr geometries to a shapely array, which is tested against windows without creating ogr objects."""
+    return shapely.from_wkb([bytes(geometry.ExportToWkb()) for geometry in geometry_list])
+
+
+def window2bounds(affine_transformer: AffineTransformer, window_arg: WindowArg):
+    """Bounds of window in crs: (min_x, min_y, max_x, max_y), same rectangle as window2geom."""
+    # both corners in one call, a call of transformer costs far more than its arithmetic
+    (min_x, max_x), (min_y, max_y) = affine_transformer.xy([window_arg.row_end, window_arg.row_start],
+                                                           [window_arg.col_start, window_arg.col_end])
 
     if min_x > max_x:
         min_x, max_x = max_x, min_x
     if min_y > max_y:
         min_y, max_y = max_y, min_y
 
+    return min_x, min_y, max_x, max_y
+
+
+def window2geom(affine_transformer: AffineTransformer, window_arg: WindowArg):
+    # ogr geometry is only needed when windows are exported, window tests use window2bounds
+    min_x, min_y, max_x, max_y = window2bounds(affine_transformer, window_arg)
+
     ring = ogr.Geometry(ogr.wkbLinearRing)
     ring.AddPoint(min_x, min_y)
     ring.AddPoint(min_x, max_y)
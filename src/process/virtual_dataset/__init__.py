@@ -0,0 +1,2 @@
+from .virtual_index import VirtualIndex
+from .virtual_dataset_reader import VirtualDatasetReader
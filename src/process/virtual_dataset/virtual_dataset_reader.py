@@ -0,0 +1,77 @@
+import numpy as np
+import rasterio
+from rasterio.windows import Window
+
+from process.sat_reader import LazyStackReader
+from process.util import WindowArg
+from .virtual_index import VirtualIndex
+
+
+class VirtualDatasetReader:
+    """Serve samples of virtual indexes by windowed reads from source bands and labels.
+
+    Bands are stacked and up sampled to dst_resolution as StackReader does, label is None if a scene has no label.
+    Band files of a scene are opened on the first sample of it and kept open until close.
+    """
+
+    def __init__(self, index_paths: str | list[str], split: str = None, dst_resolution: int = 10):
+        if isinstance(index_paths, str):
+            index_paths = [index_paths]
+        self.dst_resolution = dst_resolution
+        self.scenes = {}
+        self.samples = []
+        for index_path in index_paths:
+            virtual_index = VirtualIndex.load(index_path)
+            self.scenes.update(virtual_index.scenes)
+            self.samples.extend(sample for sample in virtual_index.samples if split is None or sample[5] == split)
+        self.sat_readers = {}
+        self.label_srcs = {}
+
+    def __len__(self):
+        return len(self.samples)
+
+    def get_sat_reader(self, scene_id: str):
+        if scene_id not in self.sat_readers:
+            scene = self.scenes[scene_id]
+            self.sat_readers[scene_id] = LazyStackReader(scene["folder_path"], scene["band_filenames"],
+                                                         self.dst_resolution)
+        return self.sat_readers[scene_id]
+
+    def read_label(self, scene_id: str, window_arg: WindowArg):
+        label_path = self.scenes[scene_id]["label_path"]
+        if label_path is None:
+            return None
+        if scene_id not in self.label_srcs:
+            self.label_srcs[scene_id] = rasterio.open(label_path)
+        window = Window.from_slices(slice(window_arg.row_start, window_arg.row_end),
+                                    slice(window_arg.col_start, window_arg.col_end))
+        return self.label_srcs[scene_id].read(window=window)
+
+    def __getitem__(self, index: int):
+        """Return image in shape (c h w), label in shape (1 h w) and the sample info."""
+        scene_id, row_start, row_end, col_start, col_end, split, window_id = self.samples[index]
+        window_arg = WindowArg(row_start, row_end, col_start, col_end)
+        image = self.get_sat_reader(scene_id).read_window_data(window_arg)
+        label = self.read_label(scene_id, window_arg)
+        return image, label, {"scene": scene_id, "window": window_arg, "split": split, "window_id": window_id}
+
+    def iter_scene_ordered(self):
+        """Iterate samples scene by scene, so band files of only one scene are open at a time."""
+        order = np.argsort([sample[0] for sample in self.samples], kind="stable")
+        current_scene_id = None
+        for index in order:
+            scene_id = self.samples[index][0]
+            if current_scene_id is not None and scene_id != current_scene_id:
+                self.close_scene(current_scene_id)
+            current_scene_id = scene_id
+            yield self[index]
+
+    def close_scene(self, scene_id: str):
+        if scene_id in self.sat_readers:
+            self.sat_readers.pop(scene_id).close()
+        if scene_id in self.label_srcs:
+            self.label_srcs.pop(scene_id).close()
+
+    def close(self):
+        for scene_id in list(self.scenes):
+            self.close_scene(scene_id)
@@ -0,0 +1,45 @@
+import json
+import os
+
+from process.util import WindowArg
+
+
+class VirtualIndex:
+    """Index of windows to read from source bands and labels instead of cropped copies of them.
+
+    It is saved as one json, such as
+    {"scenes": {scene_id: {"folder_path": ..., "band_filenames": [...], "label_path": ...}},
+     "samples": [[scene_id, row_start, row_end, col_start, col_end, split, window_id], ...]}
+    """
+
+    def __init__(self, output_path: str):
+        self.output_path = output_path
+        self.scenes = {}
+        self.samples = []
+
+    def add_scene(self, scene_id: str, folder_path: str, band_filenames: list[str], label_path: str = None):
+        self.scenes[scene_id] = {
+            "folder_path": os.path.abspath(folder_path),
+            "band_filenames": band_filenames,
+            "label_path": os.path.abspath(label_path) if label_path is not None else None,
+        }
+
+    def add_sample(self, scene_id: str, window_arg: WindowArg, split: str, window_id: str):
+        self.samples.append([scene_id, window_arg.row_start, window_arg.row_end,
+                             window_arg.col_start, window_arg.col_end, split, window_id])
+
+    def save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.output_path)), exist_ok=True)
+        temp_path = f"{self.output_path}.part"
+        with open(temp_path, "w") as file:
+            json.dump({"scenes": self.scenes, "samples": self.samples}, file)
+        os.replace(temp_path, self.output_path)
+
+    @classmethod
+    def load(cls, index_path: str):
+        with open(index_path, "r") as file:
+            content = json.load(file)
+        virtual_index = cls(index_path)
+        virtual_index.scenes = content["scenes"]
+        virtual_index.samples = content["samples"]
+        return virtual_index
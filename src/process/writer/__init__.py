@@ -0,0 +1,7 @@
+from .base_writer import BaseWriter
+from .geotiff_writer import GeoTiffWriter
+from .tar_shard_writer import TarShardWriter
+from .async_writer import AsyncWriter
+from .creation_profile import CreationProfile, creation_profiles
+
+writer_choices = ["tif", "tar"]
@@ -0,0 +1,52 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+
+import numpy as np
+
+from process.util import WindowArg
+from .base_writer import BaseWriter
+
+
+class AsyncWriter(BaseWriter):
+    """Run writes of another writer in a thread pool, so cropping goes on while samples are encoded.
+
+    At most max_pending samples wait in memory, further writes block until one is finished.
+    The first error of a background write is raised by the next write or close.
+    """
+
+    def __init__(self, writer: BaseWriter, max_workers: int = 4, max_pending: int = None):
+        self.writer = writer
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.pending = threading.BoundedSemaphore(max_pending if max_pending is not None else max_workers * 2)
+        self.error = None
+
+    def on_done(self, future: Future):
+        self.pending.release()
+        if future.exception() is not None and self.error is None:
+            self.error = future.exception()
+
+    def check_error(self):
+        if self.error is not None:
+            raise self.error
+
+    def submit(self, fn, *args):
+        self.check_error()
+        self.pending.acquire()
+        try:
+            future = self.executor.submit(fn, *args)
+        except Exception:
+            self.pending.release()
+            raise
+        future.add_done_callback(self.on_done)
+
+    def write(self, output_path: str, data: np.ndarray, profile: dict, window_arg: WindowArg = None):
+        self.submit(self.writer.write, output_path, data, profile, window_arg)
+
+    def write_folder(self, output_folder: str, filenames: list[str], datas: list[np.ndarray], profiles: list[dict],
+                     window_arg: WindowArg = None):
+        self.submit(self.writer.write_folder, output_folder, filenames, datas, profiles, window_arg)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.writer.close()
+        self.check_error()
@@ -0,0 +1,18 @@
+import os
+
+import numpy as np
+
+from process.util import WindowArg
+
+
+class BaseWriter:
+    def write(self, output_path: str, data: np.ndarray, profile: dict, window_arg: WindowArg = None):
+        raise NotImplementedError
+
+    def write_folder(self, output_folder: str, filenames: list[str], datas: list[np.ndarray], profiles: list[dict],
+                     window_arg: WindowArg = None):
+        for filename, data, profile in zip(filenames, datas, profiles):
+            self.write(os.path.join(output_folder, filename), data, profile, window_arg)
+
+    def close(self):
+        pass
@@ -0,0 +1,54 @@
+import dataclasses
+
+import numpy as np
+
+
+@dataclasses.dataclass
+class CreationProfile:
+    compress: str = None
+    # add horizontal differencing predictor, floating point predictor is used for float data
+    predictor: bool = False
+    level: int = None
+    tiled: bool = True
+    block_size: int = 256
+    overviews: bool = False
+
+    def get_options(self, dtype: str, height: int, width: int):
+        options = {"compress": self.compress}
+        if self.compress is not None and self.predictor:
+            options["predictor"] = 3 if np.dtype(dtype).kind == "f" else 2
+        if self.level is not None:
+            match self.compress:
+                case "deflate":
+                    options["zlevel"] = self.level
+                case "zstd":
+                    options["zstd_level"] = self.level
+        options["tiled"] = self.tiled
+        if self.tiled:
+            # block size should be a multiple of 16 and not much bigger than the sample
+            options["blockxsize"] = min(self.block_size, max(16, (width + 15) // 16 * 16))
+            options["blockysize"] = min(self.block_size, max(16, (height + 15) // 16 * 16))
+        return options
+
+    def get_overview_factors(self, height: int, width: int):
+        if not self.overviews:
+            return []
+        factors = []
+        factor = 2
+        while min(height, width) // factor >= 64:
+            factors.append(factor)
+            factor *= 2
+        return factors
+
+
+# source keeps the profile of the input band
+creation_profiles = {
+    "source": None,
+    "none": CreationProfile(compress=None),
+    "lzw": CreationProfile(compress="lzw", predictor=True),
+    "deflate": CreationProfile(compress="deflate", predictor=True, level=6),
+    "deflate_fast": CreationProfile(compress="deflate", predictor=True, level=1),
+    "zstd": CreationProfile(compress="zstd", predictor=True, level=9),
+    "zstd_fast": CreationProfile(compress="zstd", predictor=True, level=1),
+    "lzw_overview": CreationProfile(compress="lzw", predictor=True, overviews=True),
+}
@@ -0,0 +1,64 @@
+import copy
+import os
+import shutil
+
+import numpy as np
+import rasterio
+from rasterio.enums import Resampling
+
+from process.util import WindowArg
+from .base_writer import BaseWriter
+from .creation_profile import CreationProfile, creation_profiles
+
+
+class GeoTiffWriter(BaseWriter):
+    """Write every sample as a GeoTIFF file, the default dataset layout.
+
+    Samples keep the profile of their source unless a creation profile is given.
+    """
+    creation_keys = ["compress", "predictor", "zlevel", "zstd_level", "tiled", "blockxsize", "blockysize"]
+
+    def __init__(self, creation_profile: str | CreationProfile = None):
+        if isinstance(creation_profile, str):
+            creation_profile = creation_profiles[creation_profile]
+        self.creation_profile = creation_profile
+
+    def get_profile(self, profile: dict):
+        if self.creation_profile is None:
+            return profile
+        profile = copy.copy(profile)
+        for key in self.creation_keys:
+            profile.pop(key, None)
+        profile.update(self.creation_profile.get_options(profile["dtype"], profile["height"], profile["width"]))
+        return profile
+
+    def write_file(self, output_path: str, data: np.ndarray, profile: dict):
+        profile = self.get_profile(profile)
+        with rasterio.open(output_path, "w", **profile) as dst:
+            dst.write(data)
+            if self.creation_profile is not None:
+                overview_factors = self.creation_profile.get_overview_factors(profile["height"], profile["width"])
+                if len(overview_factors) > 0:
+                    dst.build_overviews(overview_factors, Resampling.nearest)
+
+    def write(self, output_path: str, data: np.ndarray, profile: dict, window_arg: WindowArg = None):
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        self.write_file(output_path, data, profile)
+
+    def write_folder(self, output_folder: str, filenames: list[str], datas: list[np.ndarray], profiles: list[dict],
+                     window_arg: WindowArg = None):
+        # write files to a temp folder and rename it, so a sample is written completely or not at all
+        temp_folder = f"{output_folder}.part"
+        if os.path.exists(temp_folder):
+            shutil.rmtree(temp_folder)
+        os.makedirs(temp_folder)
+        try:
+            for filename, data, profile in zip(filenames, datas, profiles):
+                self.write_file(os.path.join(temp_folder, filename), data, profile)
+        except Exception:
+            shutil.rmtree(temp_folder)
+            raise
+
+        if os.path.exists(output_folder):
+            shutil.rmtree(output_folder)
+        os.replace(temp_folder, output_folder)
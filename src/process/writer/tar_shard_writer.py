@@ -0,0 +1,102 @@
+import io
+import json
+import os
+import re
+import tarfile
+import threading
+
+import numpy as np
+
+from process.util import WindowArg
+from .base_writer import BaseWriter
+
+
+class TarShardWriter(BaseWriter):
+    """Pack samples as .npy members into tar shards of about max_shard_size bytes.
+
+    Sample key is the output path relative to output_folder without extension, split is its first folder
+    if it is train, val or test. Every shard {prefix}-{shard_id:06d}.tar has an index {prefix}-{shard_id:06d}.jsonl
+    with key, member, split, window, transform, crs, dtype and shape of its samples.
+    Shard and index are written to temp files and renamed when the shard is full or the writer is closed.
+    Shards of the same prefix left by an earlier run are removed when the writer is created, as a rerun replaces
+    its samples.
+    """
+    split_names = ["train", "val", "test"]
+
+    def __init__(self, output_folder: str, prefix: str = "shard", max_shard_size: int = 1024 ** 3):
+        self.output_folder = output_folder
+        self.prefix = prefix
+        self.max_shard_size = max_shard_size
+        self.shard_id = 0
+        self.tar = None
+        self.index = []
+        # samples may be written by several threads
+        self.lock = threading.Lock()
+        os.makedirs(output_folder, exist_ok=True)
+        self.remove_old_shards()
+
+    def remove_old_shards(self):
+        pattern = re.compile(rf"{re.escape(self.prefix)}-\d{{6}}\.(tar|jsonl)(\.part)?")
+        for filename in os.listdir(self.output_folder):
+            if pattern.fullmatch(filename):
+                os.remove(os.path.join(self.output_folder, filename))
+
+    def get_shard_path(self):
+        return os.path.join(self.output_folder, f"{self.prefix}-{self.shard_id:06d}.tar")
+
+    def open_shard(self):
+        self.tar = tarfile.open(f"{self.get_shard_path()}.part", "w")
+        self.index = []
+
+    def close_shard(self):
+        shard_path = self.get_shard_path()
+        index_path = f"{os.path.splitext(shard_path)[0]}.jsonl"
+        self.tar.close()
+        with open(f"{index_path}.part", "w") as file:
+            for entry in self.index:
+                file.write(json.dumps(entry) + "\n")
+        os.replace(f"{shard_path}.part", shard_path)
+        os.replace(f"{index_path}.part", index_path)
+        self.tar = None
+        self.shard_id += 1
+
+    def get_key(self, output_path: str):
+        return os.path.splitext(os.path.relpath(output_path, self.output_folder))[0].replace(os.sep, "/")
+
+    def get_split(self, key: str):
+        split = key.split("/")[0]
+        return split if split in self.split_names else None
+
+    def write(self, output_path: str, data: np.ndarray, profile: dict, window_arg: WindowArg = None):
+        buffer = io.BytesIO()
+        np.save(buffer, data)
+        key = self.get_key(output_path)
+        member = tarfile.TarInfo(name=f"{key}.npy")
+        member.size = buffer.tell()
+        buffer.seek(0)
+
+        crs = profile.get("crs")
+        entry = {
+            "key": key,
+            "member": member.name,
+            "split": self.get_split(key),
+            "window": [window_arg.row_start, window_arg.row_end, window_arg.col_start, window_arg.col_end]
+            if window_arg is not None else None,
+            "transform": list(profile["transform"])[:6],
+            "crs": crs.to_wkt() if crs is not None else None,
+            "dtype": str(data.dtype),
+            "shape": list(data.shape),
+        }
+
+        with self.lock:
+            if self.tar is None:
+                self.open_shard()
+            self.tar.addfile(member, buffer)
+            self.index.append(entry)
+            if self.tar.fileobj.tell() >= self.max_shard_size:
+                self.close_shard()
+
+    def close(self):
+        with self.lock:
+            if self.tar is not None:
+                self.close_shard()
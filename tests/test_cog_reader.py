@@ -0,0 +1,115 @@
+import functools
+import http.server
+import os
+import threading
+
+import numpy as np
+import pytest
+import rasterio
+from rasterio.transform import from_origin
+from rasterio.windows import Window
+
+from process.sat_reader.cog_reader import CogBlockReader
+from process.util import WindowArg
+
+
+class RangeHandler(http.server.SimpleHTTPRequestHandler):
+    """Serve files of a folder with Range requests, as object stores serve Cloud-Optimized GeoTIFF."""
+    range_headers = []
+
+    def send_head(self):
+        path = self.translate_path(self.path)
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return None
+        with open(path, "rb") as file:
+            content = file.read()
+
+        range_header = self.headers.get("Range")
+        type(self).range_headers.append(range_header)
+        if range_header is None:
+            self.send_response(200)
+            body = content
+        else:
+            start, end = range_header.removeprefix("bytes=").split("-")
+            end = min(int(end), len(content) - 1) if end else len(content) - 1
+            body = content[int(start):end + 1]
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(content)}")
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        return body
+
+    def do_HEAD(self):
+        self.send_head()
+
+    def do_GET(self):
+        body = self.send_head()
+        if body is not None:
+            self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def cog_href(tmp_path):
+    RangeHandler.range_headers = []
+    # 2 bands in 64 pixel blocks, the last row and column of blocks are partial
+    data = np.arange(2 * 150 * 200, dtype=np.uint16).reshape(2, 150, 200)
+    tif_path = tmp_path / "B04.tif"
+    with rasterio.open(tif_path, "w", driver="GTiff", height=150, width=200, count=2, dtype="uint16",
+                       crs="EPSG:32650", transform=from_origin(0, 1500, 10, 10),
+                       tiled=True, blockxsize=64, blockysize=64) as dst:
+        dst.write(data)
+
+    handler = functools.partial(RangeHandler, directory=str(tmp_path))
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}/B04.tif", str(tif_path)
+    httpd.shutdown()
+    httpd.server_close()
+
+
+windows = [
+    WindowArg(0, 64, 0, 64),
+    WindowArg(10, 100, 50, 130),
+    WindowArg(60, 70, 60, 70),
+    WindowArg(100, 150, 150, 200),
+    WindowArg(0, 150, 0, 200),
+]
+
+
+def test_read_equals_windowed_read(cog_href, tmp_path):
+    href, tif_path = cog_href
+    reader = CogBlockReader(href, str(tmp_path / "cache"))
+    assert (reader.block_height, reader.block_width) == (64, 64)
+
+    with rasterio.open(tif_path) as src:
+        for window_arg in windows:
+            window = Window.from_slices((window_arg.row_start, window_arg.row_end),
+                                        (window_arg.col_start, window_arg.col_end))
+            assert np.array_equal(reader.read(window_arg), src.read(window=window))
+    reader.close()
+    assert any(range_header is not None for range_header in RangeHandler.range_headers)
+
+
+def test_second_read_from_block_cache(cog_href, tmp_path):
+    href, _ = cog_href
+    window_arg = WindowArg(10, 100, 50, 130)
+    reader = CogBlockReader(href, str(tmp_path / "cache"))
+    data = reader.read(window_arg)
+    # blocks of rows 0 to 1 and columns 0 to 2
+    assert sorted(os.listdir(reader.cache_folder)) == [f"{row}_{col}.npy" for row in range(2) for col in range(3)]
+    reader.close()
+
+    # a later run reads cached blocks without fetching them again
+    def fetch(*args, **kwargs):
+        raise AssertionError("cached block is fetched again")
+
+    reader = CogBlockReader(href, str(tmp_path / "cache"))
+    reader.src.read = fetch
+    assert np.array_equal(reader.read(window_arg), data)
+    reader.close()
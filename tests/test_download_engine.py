@@ -0,0 +1,173 @@
+import hashlib
+import http.server
+import os
+import threading
+
+import pytest
+
+from process.downloader.download_engine import DownloadEngine, DownloadTask
+
+content = bytes(range(256)) * 4096
+
+
+class FileHandler(http.server.BaseHTTPRequestHandler):
+    """Serve content with an etag, the server honours Range unless ignore_range is set.
+
+    The first fail_count GET requests are answered with 503.
+    """
+    etag = '"v1"'
+    ignore_range = False
+    fail_count = 0
+    requests = []
+
+    def send_content_headers(self, status: int, length: int):
+        self.send_response(status)
+        self.send_header("Content-Length", str(length))
+        self.send_header("ETag", self.etag)
+
+    def do_HEAD(self):
+        self.send_content_headers(200, len(content))
+        self.end_headers()
+
+    def do_GET(self):
+        type(self).requests.append(dict(self.headers))
+        if type(self).fail_count > 0:
+            type(self).fail_count -= 1
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        range_header = self.headers.get("Range")
+        if_range = self.headers.get("If-Range")
+        if range_header is not None and not self.ignore_range and (if_range is None or if_range == self.etag):
+            offset = int(range_header.removeprefix("bytes=").removesuffix("-"))
+            self.send_content_headers(206, len(content) - offset)
+            self.send_header("Content-Range", f"bytes {offset}-{len(content) - 1}/{len(content)}")
+            self.end_headers()
+            self.wfile.write(content[offset:])
+        else:
+            self.send_content_headers(200, len(content))
+            self.end_headers()
+            self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    FileHandler.etag = '"v1"'
+    FileHandler.ignore_range = False
+    FileHandler.fail_count = 0
+    FileHandler.requests = []
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), FileHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}/B04.tif"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def write_part(download_path: str, size: int, etag: str):
+    with open(download_path + DownloadEngine.part_suffix, "wb") as file:
+        file.write(content[:size])
+    with open(download_path + DownloadEngine.part_suffix + DownloadEngine.etag_suffix, "w") as file:
+        file.write(etag)
+
+
+def download(href: str, download_path: str, max_retries: int = 0):
+    engine = DownloadEngine(max_workers=1, max_retries=max_retries)
+    engine.backoff_factor = 0
+    return engine.download_one(DownloadTask(href, download_path))
+
+
+def read(path: str):
+    with open(path, "rb") as file:
+        return file.read()
+
+
+def test_resume_with_range_and_if_range(server, tmp_path):
+    download_path = str(tmp_path / "B04.tif")
+    write_part(download_path, 1000, "v1")
+
+    download(server, download_path)
+
+    assert read(download_path) == content
+    assert FileHandler.requests[-1]["Range"] == "bytes=1000-"
+    assert FileHandler.requests[-1]["If-Range"] == '"v1"'
+    assert not os.path.exists(download_path + DownloadEngine.part_suffix)
+
+
+def test_whole_file_when_range_is_ignored(server, tmp_path):
+    FileHandler.ignore_range = True
+    download_path = str(tmp_path / "B04.tif")
+    write_part(download_path, 1000, "v1")
+
+    download(server, download_path)
+
+    assert FileHandler.requests[-1]["Range"] == "bytes=1000-"
+    assert read(download_path) == content
+
+
+def test_restart_when_etag_changed(server, tmp_path):
+    FileHandler.etag = '"v2"'
+    download_path = str(tmp_path / "B04.tif")
+    write_part(download_path, 1000, "v1")
+
+    download(server, download_path)
+
+    assert "Range" not in FileHandler.requests[-1]
+    assert read(download_path) == content
+
+
+def test_weak_etag_is_not_sent_in_if_range(server, tmp_path):
+    FileHandler.etag = 'W/"v1"'
+    download_path = str(tmp_path / "B04.tif")
+    write_part(download_path, 1000, "W/v1")
+
+    download(server, download_path)
+
+    assert FileHandler.requests[-1]["Range"] == "bytes=1000-"
+    assert "If-Range" not in FileHandler.requests[-1]
+    assert read(download_path) == content
+
+
+def test_md5_mismatch_removes_part(server, tmp_path):
+    FileHandler.etag = f'"{hashlib.md5(b"other").hexdigest()}"'
+    download_path = str(tmp_path / "B04.tif")
+
+    with pytest.raises(IOError):
+        download(server, download_path)
+
+    assert not os.path.exists(download_path)
+    assert not os.path.exists(download_path + DownloadEngine.part_suffix)
+    assert not os.path.exists(download_path + DownloadEngine.part_suffix + DownloadEngine.etag_suffix)
+
+
+def test_md5_etag_is_verified(server, tmp_path):
+    FileHandler.etag = f'"{hashlib.md5(content).hexdigest()}"'
+    download_path = str(tmp_path / "B04.tif")
+
+    download(server, download_path)
+
+    assert read(download_path) == content
+
+
+def test_retry_after_server_error(server, tmp_path):
+    FileHandler.fail_count = 2
+    download_path = str(tmp_path / "B04.tif")
+
+    download(server, download_path, max_retries=2)
+
+    assert read(download_path) == content
+    assert len(FileHandler.requests) == 3
+
+
+def test_one_request_per_retry(server, tmp_path):
+    FileHandler.fail_count = 10
+    download_path = str(tmp_path / "B04.tif")
+
+    with pytest.raises(IOError):
+        download(server, download_path, max_retries=1)
+
+    assert len(FileHandler.requests) == 2
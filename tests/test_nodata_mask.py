@@ -0,0 +1,17 @@
+import numpy as np
+from rasterio import features
+
+from process.gt_reader.nodata_mask import sieve_nodata_mask
+
+
+def test_tiled_sieve_equals_whole_image():
+    rng = np.random.default_rng(0)
+    # random valid and nodata regions of many sizes, cut by tile borders
+    band = (rng.random(size=(300, 250)) < 0.6).astype(np.uint16)
+
+    expected = features.sieve((band != 0).view(np.uint8), size=20) == 0
+    assert not np.array_equal(expected, band == 0)
+    nodata_mask = sieve_nodata_mask(band, size=20, tile_size=64, max_workers=2)
+
+    assert np.array_equal(nodata_mask, expected)
+    assert np.array_equal(sieve_nodata_mask(band, size=20, max_workers=1), expected)
@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+import shapely
+from rasterio import features
+from rasterio.transform import from_origin
+
+from process.cropper import ObjectOrientedCropper, PartitionedObjectCropper
+from process.gt_reader import ScoreReader
+
+window_size = 256
+
+
+@pytest.fixture(scope="module")
+def scene():
+    """Triangles of many sizes burned in a 10 m scene, a few are larger than blocks, a corner is unsure."""
+    rng = np.random.default_rng(0)
+    size = 3000
+    transform = from_origin(0, size * 10, 10, 10)
+    geometries = []
+    for _ in range(1500):
+        x, y = rng.uniform(0, size * 10, 2)
+        length = rng.uniform(100, 1500) if rng.random() < 0.95 else rng.uniform(3000, 20000)
+        geometries.append(shapely.Polygon([(x, y), (x + length, y + rng.uniform(-length / 3, length / 3)),
+                                           (x + rng.uniform(0, length), y + length)]))
+    # large geometries first, as init_oo_cropper sorts them
+    geometries = np.array(sorted(geometries, key=lambda geometry: -geometry.area), dtype=object)
+    data = features.rasterize([(geometry, 1 + i % 5) for i, geometry in enumerate(geometries)],
+                              out_shape=(size, size), transform=transform).astype(np.uint8)[None]
+    data[:, :300, :300] = ScoreReader.unsure_value
+    return transform, geometries, data
+
+
+def crop(cropper_class, scene, **kwargs):
+    """Windows of cropper and count of labelled pixels covered by them, every window is cropped as it is yielded."""
+    transform, geometries, data = scene
+    score_reader = ScoreReader(data.copy(), transform)
+    cropper = cropper_class(data.shape[1], data.shape[2], window_size, geometries, score_reader, **kwargs)
+    windows = []
+    for window_arg, window_id in cropper:
+        windows.append(window_arg)
+        score_reader.update_cropped_area(window_arg)
+    is_labelled = (0 < data) & (data < 100)
+    covered_count = np.count_nonzero(is_labelled & (score_reader.data_for_score == ScoreReader.cropped_value))
+    return windows, covered_count
+
+
+@pytest.fixture(scope="module")
+def sequential(scene):
+    return crop(ObjectOrientedCropper, scene)
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_close_to_sequential_cropper(scene, sequential, max_workers):
+    _, _, data = scene
+    labelled_count = np.count_nonzero((0 < data) & (data < 100))
+    sequential_windows, sequential_covered_count = sequential
+
+    windows, covered_count = crop(PartitionedObjectCropper, scene, block_size=1024, max_workers=max_workers)
+
+    assert abs(covered_count - sequential_covered_count) <= 0.001 * labelled_count
+    assert len(windows) <= 1.03 * len(sequential_windows)
+
+
+def test_empty_plan_is_planned_again_when_window_of_its_partition_is_dropped():
+    # three small squares in a 64 * 64 scene of 1 m pixels, row r and column c is at (c, 64 - r)
+    data = np.zeros(shape=(1, 64, 64), dtype=np.uint8)
+    data[0, :16, :16] = ScoreReader.cropped_value
+    data[0, 20:24, 20:24] = 1
+    data[0, 50:54, 40:44] = 1
+    geometries = np.array([shapely.box(2, 52, 10, 60), shapely.box(20, 40, 24, 44), shapely.box(40, 10, 44, 14)])
+    score_reader = ScoreReader(data, from_origin(0, 64, 1, 1))
+    cropper = PartitionedObjectCropper(64, 64, 16, geometries, score_reader, block_size=32)
+
+    # the window of geometry 0 is cropped in scene, it cropped geometry 1 in their partition,
+    # geometry 2 has no window in another partition
+    dropped_window = cropper.get_window_and_check_bound(0, 0)
+    cropper.plan = lambda: ({0: [dropped_window], 1: [], 2: []}, {0: 0, 1: 0, 2: 1})
+
+    geometry_ids = [i for i, _ in cropper.iter_geometry_windows()]
+
+    assert geometry_ids == [1]
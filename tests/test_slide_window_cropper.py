@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+from rasterio.transform import Affine
+
+from process.cropper import SlideWindowCropper
+from process.gt_reader import ScoreReader
+from process.integral_image import NodataIndex
+from process.util import WindowArg
+
+# image sizes are not multiples of the stride, the last windows are clamped to image edge
+cases = [(500, 430, 64, 16), (300, 300, 128, 0), (130, 200, 128, 0), (257, 513, 64, 57)]
+
+
+def get_window_and_check_bound(cropper: SlideWindowCropper, row_start: int, col_start: int):
+    row_start = max(min(row_start, cropper.image_height - cropper.window_size), 0)
+    col_start = max(min(col_start, cropper.image_width - cropper.window_size), 0)
+    return WindowArg(row_start=row_start, row_end=row_start + cropper.window_size,
+                     col_start=col_start, col_end=col_start + cropper.window_size)
+
+
+def is_nodata_window(cropper: SlideWindowCropper, window_arg: WindowArg):
+    if cropper.nodata_index is None or cropper.drop_nodata_percentage is None:
+        return False
+    return cropper.nodata_index.get_nodata_percentage(window_arg) >= cropper.drop_nodata_percentage
+
+
+def baseline_iter(cropper: SlideWindowCropper):
+    """Nested loops over window starts, the generator before windows were planned in batch."""
+    real_window_size = cropper.window_size - cropper.overlap_size
+    row_count = (cropper.image_height - cropper.window_size) // real_window_size + 2
+    col_count = (cropper.image_width - cropper.window_size) // real_window_size + 2
+    for row_id in range(row_count):
+        for col_id in range(col_count):
+            window_arg = get_window_and_check_bound(cropper, row_id * real_window_size, col_id * real_window_size)
+            if is_nodata_window(cropper, window_arg):
+                continue
+            if cropper.shp_reader is not None and cropper.shp_reader.get_window_score(window_arg) is None:
+                continue
+            yield window_arg, f"{row_id + 1:02}{col_id + 1:02}"
+
+
+def make_score_reader(height: int, width: int):
+    rng = np.random.default_rng(1)
+    data = np.zeros(shape=(1, height, width), dtype=np.uint8)
+    for value in [1, 2] * 15:
+        row, col = rng.integers(0, height), rng.integers(0, width)
+        data[0, row:row + 40, col:col + 40] = value
+    # windows on the bottom right corner are dropped
+    data[0, -10:, -10:] = ScoreReader.unsure_value
+    return ScoreReader(data, Affine.identity())
+
+
+def make_nodata_index(height: int, width: int):
+    nodata_index = NodataIndex(band_count=2)
+    nodata_count = np.zeros(shape=(height, width), dtype=np.uint8)
+    nodata_count[:height // 3, :width // 4] = 1
+    nodata_index.add_layer(nodata_count)
+    # a band in half resolution
+    low_nodata_count = np.zeros(shape=(-(-height // 2), -(-width // 2)), dtype=np.uint8)
+    low_nodata_count[-height // 6:, :] = 1
+    nodata_index.add_layer(low_nodata_count, factor=2)
+    return nodata_index
+
+
+def crop(windows, score_reader: ScoreReader):
+    # crop every window before the next one is taken, as the dataset cli does
+    result = []
+    for window_arg, window_id in windows:
+        result.append((window_arg, window_id))
+        score_reader.update_cropped_area(window_arg)
+    return result
+
+
+@pytest.mark.parametrize("height, width, window_size, overlap_size", cases)
+def test_same_windows_with_crop_updates(height, width, window_size, overlap_size):
+    results = []
+    for iter_windows in [baseline_iter, iter]:
+        score_reader = make_score_reader(height, width)
+        cropper = SlideWindowCropper(height, width, window_size, overlap_size, score_reader,
+                                     make_nodata_index(height, width), drop_nodata_percentage=0.3)
+        results.append(crop(iter_windows(cropper), score_reader))
+
+    assert results[0] == results[1]
+
+
+@pytest.mark.parametrize("height, width, window_size, overlap_size", cases)
+def test_same_windows_without_score_reader(height, width, window_size, overlap_size):
+    for nodata_index in [None, make_nodata_index(height, width)]:
+        cropper = SlideWindowCropper(height, width, window_size, overlap_size, nodata_index=nodata_index,
+                                     drop_nodata_percentage=0.3)
+        baseline_windows = list(baseline_iter(cropper))
+        windows = list(cropper)
+
+        # windows clamped to image edge are yielded once, with the id of the first of them
+        unique_windows = {}
+        for window_arg, window_id in baseline_windows:
+            unique_windows.setdefault(str(window_arg), window_id)
+        assert [(str(window_arg), window_id) for window_arg, window_id in windows] == list(unique_windows.items())
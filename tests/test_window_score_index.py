@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from process.gt_reader.window_score_index import WindowScoreIndex
+from process.util import WindowArg
+
+unsure_value = 255
+height, width = 203, 317
+
+
+def brute_force_count(data: np.ndarray, row_start: int, row_end: int, col_start: int, col_end: int):
+    window = data[0, max(row_start, 0):max(min(row_end, height), 0), max(col_start, 0):max(min(col_end, width), 0)]
+    return np.count_nonzero((0 < window) & (window < 100)), np.count_nonzero(window == unsure_value)
+
+
+def random_windows(rng: np.random.Generator, count: int, block_size: int):
+    row_starts = rng.integers(-20, height + 20, count)
+    row_ends = row_starts + rng.integers(0, 120, count)
+    col_starts = rng.integers(-20, width + 20, count)
+    col_ends = col_starts + rng.integers(0, 120, count)
+    # half of the windows have edges on block borders
+    is_aligned = rng.random(count) < 0.5
+    for lines in [row_starts, row_ends, col_starts, col_ends]:
+        lines[is_aligned] = lines[is_aligned] // block_size * block_size
+    return row_starts, row_ends, col_starts, col_ends
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(0)
+
+
+@pytest.fixture
+def data(rng):
+    return rng.choice([0, 1, 5, 99, 100, 254, 255], size=(1, height, width)).astype(np.uint8)
+
+
+@pytest.mark.parametrize("block_size", [16, 7])
+def test_count(rng, data, block_size):
+    index = WindowScoreIndex(data.copy(), unsure_value, block_size)
+    for window in zip(*random_windows(rng, 500, block_size)):
+        clipped = WindowArg(max(window[0], 0), min(window[1], height), max(window[2], 0), min(window[3], width))
+        if clipped.row_start >= clipped.row_end or clipped.col_start >= clipped.col_end:
+            continue
+        assert tuple(index.count(clipped)) == brute_force_count(data, *window)
+
+
+@pytest.mark.parametrize("block_size", [16, 7])
+def test_count_batch(rng, data, block_size):
+    index = WindowScoreIndex(data.copy(), unsure_value, block_size)
+    windows = random_windows(rng, 2000, block_size)
+    labelled_counts, unsure_counts = index.count_batch(*windows)
+    for i, window in enumerate(zip(*windows)):
+        assert (labelled_counts[i], unsure_counts[i]) == brute_force_count(data, *window)
+
+
+def test_assign(rng, data):
+    index = WindowScoreIndex(data.copy(), unsure_value)
+    for _ in range(50):
+        row_start, col_start = rng.integers(0, height), rng.integers(0, width)
+        window = WindowArg(row_start, min(row_start + rng.integers(1, 80), height),
+                           col_start, min(col_start + rng.integers(1, 80), width))
+        value = rng.choice([0, 50, 100, unsure_value])
+        index.assign(window, value)
+        data[0, window.row_start:window.row_end, window.col_start:window.col_end] = value
+
+    assert np.array_equal(index.data, data[0])
+    windows = random_windows(rng, 1000, index.block_size)
+    labelled_counts, unsure_counts = index.count_batch(*windows)
+    for i, window in enumerate(zip(*windows)):
+        assert (labelled_counts[i], unsure_counts[i]) == brute_force_count(data, *window)